@@ -1,7 +1,10 @@
-from .load_url import load_url
+from .load_url import load_url, iter_url, aload_url
 from .save import save
 from .logger import logger
+from .session import configure_session
+from .decode import decode
+from . import cache
 from . import ons
 from . import nomis
-from .load_zip import load_zip
-__all__ = ['load_url', 'load_zip', 'save', 'logger', 'ons', 'nomis']
+from .load_zip import load_zip, aload_zip
+__all__ = ['load_url', 'iter_url', 'aload_url', 'load_zip', 'aload_zip', 'save', 'logger', 'configure_session', 'decode', 'cache', 'ons', 'nomis']
@@ -0,0 +1,11 @@
+import sys
+from . import cache
+
+COMMANDS = {
+    'cache': cache.main,
+}
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        sys.exit(f"Usage: python -m updatabot [{'|'.join(COMMANDS)}] ...")
+    COMMANDS[sys.argv[1]](sys.argv[2:])
@@ -0,0 +1,603 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Iterator
+import numpy as np
+import pandas as pd
+from .logger import logger
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Pass as a TTL to keep an entry forever
+NEVER_EXPIRE = math.inf
+
+DEFAULT_TTL_MINS = 60
+
+# Name of the sidecar in each entry directory. Its mtime is the last access time.
+META_FILENAME = '.meta.json'
+
+# Subdirectory of an entry holding files derived from the download,
+# eg. parsed DataFrames. Bump PARSED_VERSION to invalidate them all.
+PARSED_DIRNAME = '.parsed'
+PARSED_VERSION = 1
+
+# Subdirectory of an entry holding a ZIP read in place with
+# load_zip(remote=True). It has its own .meta.json.
+REMOTE_DIRNAME = 'remote'
+
+# Lock file in each entry directory, held while the entry is downloaded
+# or evicted
+LOCK_FILENAME = '.lock'
+
+# Entries used this recently are never evicted, so that a caller who has
+# just been handed a cached file can still open it
+EVICT_GRACE_SECS = 60
+
+# Longest time a process trusts its own running total of the cache size,
+# before walking the cache to see other processes' downloads
+SIZE_ESTIMATE_SECS = 60
+
+# Cache directory -> (estimated size in bytes, time.monotonic() when walked)
+_size_estimates: dict[str, tuple[int, float]] = {}
+_size_estimates_guard = threading.Lock()
+
+# (pattern, minutes) pairs. Later entries take precedence.
+_rules: list[tuple[re.Pattern, float]] = []
+_defaults: list[tuple[re.Pattern, float]] = []
+
+
+def _get_cache_dir() -> Path:
+    default_cache_dir = os.path.expanduser('~/.cache/updatabot')
+    outpath = os.environ.get('UPDATABOT_CACHE_DIR', default_cache_dir)
+    return Path(outpath)
+
+
+def _tmp_name(name: str) -> str:
+    """Name for a temporary file next to `name`, unique to this process and thread"""
+    return f".{name.lstrip('.')}.{os.getpid()}.{threading.get_ident()}.part"
+
+
+# Entry directory -> lock, so that threads of this process take turns
+# before competing with other processes for the lock file. A lock is
+# dropped once no thread holds or waits for it.
+_thread_locks: weakref.WeakValueDictionary[str, threading.Lock] = weakref.WeakValueDictionary()
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(entry_dir: Path) -> threading.Lock:
+    with _thread_locks_guard:
+        lock = _thread_locks.get(str(entry_dir))
+        if lock is None:
+            lock = _thread_locks[str(entry_dir)] = threading.Lock()
+        return lock
+
+
+def _lock_file(f, blocking: bool) -> bool:
+    if fcntl:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.05)
+
+
+def _unlock_file(f) -> None:
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def _locked(entry_dir: Path, blocking: bool = True) -> Iterator[bool]:
+    """
+    Hold an entry's lock, shared by every thread and process using this
+    cache directory. Yields True once held. With blocking=False, yields
+    False straight away if someone else holds it.
+    """
+    thread_lock = _thread_lock(entry_dir)
+    if not thread_lock.acquire(blocking):
+        yield False
+        return
+    try:
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        lock_path = entry_dir / LOCK_FILENAME
+        while True:
+            f = open(lock_path, 'a+b')
+            if not _lock_file(f, blocking):
+                f.close()
+                yield False
+                return
+            # The entry may have been evicted while we waited, taking
+            # our lock file with it. Lock the new one instead.
+            try:
+                if os.path.samestat(os.fstat(f.fileno()), os.stat(lock_path)):
+                    break
+            except FileNotFoundError:
+                entry_dir.mkdir(parents=True, exist_ok=True)
+            _unlock_file(f)
+            f.close()
+        try:
+            yield True
+        finally:
+            _unlock_file(f)
+            f.close()
+    finally:
+        thread_lock.release()
+
+
+@contextlib.asynccontextmanager
+async def _alocked(entry_dir: Path, poll_secs: float = 0.05):
+    """
+    _locked() for coroutines: the same lock, polled so that the event loop
+    keeps running while someone else holds it.
+    """
+    while True:
+        with _locked(entry_dir, blocking=False) as held:
+            if held:
+                yield
+                return
+        await asyncio.sleep(poll_secs)
+
+
+def _get_meta_path(entry_dir: Path) -> Path:
+    return entry_dir / META_FILENAME
+
+
+def _read_meta(entry_dir: Path) -> dict:
+    try:
+        with open(_get_meta_path(entry_dir), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_meta(entry_dir: Path, meta: dict) -> None:
+    meta_path = _get_meta_path(entry_dir)
+    tmp_path = meta_path.with_name(_tmp_name(meta_path.name))
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def _last_access(entry_dir: Path) -> float:
+    """When the entry's download, or a remote ZIP read from it, was last used"""
+    times = []
+    for meta_dir in (entry_dir, entry_dir / REMOTE_DIRNAME):
+        try:
+            times.append(_get_meta_path(meta_dir).stat().st_mtime)
+        except FileNotFoundError:
+            pass
+    return max(times) if times else entry_dir.stat().st_mtime
+
+
+def _touch(entry_dir: Path) -> None:
+    """Record an access to a cache entry, for LRU eviction"""
+    try:
+        os.utime(_get_meta_path(entry_dir))
+    except FileNotFoundError:
+        pass
+
+
+def _parsed_key(entry_dir: Path, **options) -> str | None:
+    """Key for a file derived from an entry's download with these options.
+    The key changes whenever the downloaded file does. Returns None if the
+    entry has no content hash, in which case nothing should be stored."""
+    sha256 = _read_meta(entry_dir).get('sha256')
+    if not sha256:
+        return None
+    options = json.dumps(
+        {**options, 'version': PARSED_VERSION}, sort_keys=True, default=str)
+    return sha256[:16] + '-' + hashlib.sha256(options.encode()).hexdigest()[:16]
+
+
+def _parsed_enabled() -> bool:
+    return os.environ.get('UPDATABOT_PARSED_CACHE', '1').lower() not in ('0', 'false', 'no')
+
+
+def _parsed_dir(entry_dir: Path, key: str) -> Path:
+    """Create the .parsed directory, removing files derived from an older download"""
+    parsed_dir = entry_dir / PARSED_DIRNAME
+    parsed_dir.mkdir(exist_ok=True)
+    for old in parsed_dir.iterdir():
+        # Temporary files belong to writers still running
+        if old.name.startswith('.'):
+            continue
+        if not old.name.startswith(key.split('-')[0]):
+            old.unlink(missing_ok=True)
+    return parsed_dir
+
+
+def _read_parsed_frame(entry_dir: Path, key: str) -> pd.DataFrame | None:
+    parsed_dir = entry_dir / PARSED_DIRNAME
+    try:
+        if (parsed_dir / f"{key}.parquet").exists():
+            return pd.read_parquet(parsed_dir / f"{key}.parquet")
+        if (parsed_dir / f"{key}.pickle").exists():
+            return pd.read_pickle(parsed_dir / f"{key}.pickle")
+    except Exception as e:
+        # A corrupt or unreadable file is just a cache miss
+        logger.warning(f"Ignoring unreadable parsed cache {key} in {entry_dir}: {e}")
+    return None
+
+
+# Nullable dtypes that pandas records in Parquet metadata, and restores
+_NULLABLE_DTYPES = (pd.BooleanDtype,
+                    pd.Int8Dtype, pd.Int16Dtype, pd.Int32Dtype, pd.Int64Dtype,
+                    pd.UInt8Dtype, pd.UInt16Dtype, pd.UInt32Dtype, pd.UInt64Dtype,
+                    pd.Float32Dtype, pd.Float64Dtype)
+
+
+def _parquet_safe(df: pd.DataFrame) -> bool:
+    """True if df comes back from Parquet exactly as it went in. Checked from
+    the schema, plus a scan of object columns, without writing anything.
+    Anything unusual is left to pickle."""
+    if not isinstance(df.index, pd.RangeIndex) or isinstance(df.columns, pd.MultiIndex):
+        return False
+    if not df.columns.is_unique or not all(isinstance(c, str) for c in df.columns):
+        return False
+    for name, dtype in df.dtypes.items():
+        if isinstance(dtype, np.dtype):
+            if dtype.kind in 'biuf' or (dtype.kind in 'mM' and np.datetime_data(dtype)[0] == 'ns'):
+                continue
+            if dtype.kind != 'O':
+                return False
+            # Strings, with None for missing values. Parquet reads NaN back as None.
+            series = df[name]
+            missing = series.isna()
+            if pd.api.types.infer_dtype(series[~missing], skipna=False) not in ('string', 'empty'):
+                return False
+            if not all(v is None for v in series[missing]):
+                return False
+        elif isinstance(dtype, pd.CategoricalDtype):
+            # Other categories come back as plain columns
+            if pd.api.types.infer_dtype(dtype.categories, skipna=False) not in ('string', 'empty'):
+                return False
+        elif isinstance(dtype, pd.DatetimeTZDtype):
+            if dtype.unit != 'ns':
+                return False
+        elif isinstance(dtype, pd.StringDtype):
+            if dtype.storage != 'python':
+                return False
+        elif not isinstance(dtype, _NULLABLE_DTYPES):
+            return False
+    return True
+
+
+def _write_parquet(df: pd.DataFrame, path: Path) -> bool:
+    """Write df as Parquet, if it can hold df exactly"""
+    if not _parquet_safe(df):
+        logger.debug("DataFrame would change in a Parquet round trip, using pickle")
+        return False
+    try:
+        df.to_parquet(path)
+        return True
+    except Exception as e:
+        logger.debug(f"Cannot store DataFrame as Parquet, using pickle: {e}")
+    return False
+
+
+def _write_parsed_frame(entry_dir: Path, key: str, df: pd.DataFrame) -> bool:
+    """Store a parsed DataFrame as Parquet if pyarrow is installed and
+    Parquet can hold it unchanged (see _parquet_safe), or else as a pickle.
+    Files derived from an older download are removed.
+
+    Never raises: a DataFrame that cannot be stored, eg. on a full disk,
+    is just not cached. Returns True if it was stored."""
+    tmp_path = None
+    try:
+        parsed_dir = _parsed_dir(entry_dir, key)
+        tmp_path = parsed_dir / _tmp_name(key)
+        if importlib.util.find_spec('pyarrow') and _write_parquet(df, tmp_path):
+            os.replace(tmp_path, parsed_dir / f"{key}.parquet")
+            return True
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, parsed_dir / f"{key}.pickle")
+        return True
+    except Exception as e:
+        logger.debug(f"Not caching parsed DataFrame {key} in {entry_dir}: {e}")
+        return False
+    finally:
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+
+
+def _read_parsed_object(entry_dir: Path, key: str) -> object | None:
+    path = entry_dir / PARSED_DIRNAME / f"{key}.obj.pickle"
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable parsed cache {key} in {entry_dir}: {e}")
+        return None
+
+
+def _write_parsed_object(entry_dir: Path, key: str, obj: object) -> bool:
+    """Pickle any object derived from an entry's download.
+    Never raises: an object that cannot be stored is just not cached.
+    Returns True if it was stored."""
+    tmp_path = None
+    try:
+        parsed_dir = _parsed_dir(entry_dir, key)
+        tmp_path = parsed_dir / _tmp_name(key)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, parsed_dir / f"{key}.obj.pickle")
+        return True
+    except Exception as e:
+        logger.debug(f"Not caching parsed object {key} in {entry_dir}: {e}")
+        return False
+    finally:
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+
+
+def set_ttl(pattern: str, minutes: float) -> None:
+    """Set how long cached downloads matching a URL pattern stay fresh.
+
+    Usage:
+        updatabot.cache.set_ttl('www.nomisweb.co.uk', 24 * 60)
+        updatabot.cache.set_ttl(r'/codelist/', updatabot.cache.NEVER_EXPIRE)
+
+    Args:
+        pattern (str): Regular expression searched for in the URL.
+                       A plain hostname matches every URL on that host.
+        minutes (float): Freshness lifetime. Once it passes, the entry is
+                         revalidated with the server.
+    """
+    _rules.append((re.compile(pattern), float(minutes)))
+
+
+def clear_ttls() -> None:
+    """Forget every TTL set with set_ttl()."""
+    _rules.clear()
+
+
+def _set_default_ttl(pattern: str, minutes: float) -> None:
+    """Library-provided TTL for a kind of URL. Overridden by set_ttl()."""
+    _defaults.append((re.compile(pattern), float(minutes)))
+
+
+def _env_rules() -> list[tuple[re.Pattern, float]]:
+    """Parse UPDATABOT_CACHE_TTLS, eg. "/codelist/=10080,api.beta.ons.gov.uk=30" """
+    out = []
+    for item in os.environ.get('UPDATABOT_CACHE_TTLS', '').split(','):
+        if not item.strip():
+            continue
+        pattern, sep, minutes = item.rpartition('=')
+        if not sep:
+            raise ValueError(
+                f"Invalid UPDATABOT_CACHE_TTLS entry {item!r}. Expected pattern=minutes")
+        out.append((re.compile(pattern.strip()), float(minutes)))
+    return out
+
+
+def is_offline() -> bool:
+    """True if UPDATABOT_CACHE_OFFLINE is set: cached files never expire,
+    and nothing is downloaded."""
+    return os.environ.get('UPDATABOT_CACHE_OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+
+def get_ttl(url: str, ttl_mins: float | None = None) -> float:
+    """Resolve the freshness lifetime of a URL, in minutes.
+
+    In order of precedence:
+        1. ttl_mins, when passed for a single call
+        2. NEVER_EXPIRE in offline mode (UPDATABOT_CACHE_OFFLINE=1)
+        3. UPDATABOT_CACHE_TTLS patterns, then set_ttl() patterns
+        4. The library's defaults, eg. long-lived NOMIS codelists
+        5. UPDATABOT_CACHE_TTL, or 60 minutes
+    """
+    if ttl_mins is not None:
+        return float(ttl_mins)
+    if is_offline():
+        return NEVER_EXPIRE
+    for rules in (_env_rules(), _rules, _defaults):
+        for pattern, minutes in reversed(rules):
+            if pattern.search(url):
+                logger.debug(
+                    f"TTL for {url} is {minutes} minutes (pattern {pattern.pattern!r})")
+                return minutes
+    return float(os.environ.get('UPDATABOT_CACHE_TTL', DEFAULT_TTL_MINS))
+
+
+class CacheEntry:
+    """One cached download: a directory under the cache dir."""
+
+    def __init__(self, path: Path):
+        # Remote ZIPs keep their metadata in a subdirectory
+        meta = _read_meta(path) or _read_meta(path / REMOTE_DIRNAME)
+        self.path = path
+        # Entries written before .meta.json existed have no URL
+        self.url = meta.get('url')
+        self.fetched_at = meta.get('fetched_at')
+        self.last_access = _last_access(path)
+        # Includes derived files, eg. unzipped members
+        self.size = sum(
+            os.path.getsize(os.path.join(root, f))
+            for root, _, files in os.walk(path) for f in files)
+
+    def __str__(self):
+        accessed = time.strftime(
+            '%Y-%m-%d %H:%M', time.localtime(self.last_access))
+        return f"{self.size / 1024 / 1024:10.1f} MB  {accessed}  {self.url or self.path}"
+
+
+def entries() -> list[CacheEntry]:
+    """List cached downloads, most recently used first."""
+    cache_dir = _get_cache_dir()
+    if not cache_dir.is_dir():
+        return []
+    out = []
+    for path in cache_dir.iterdir():
+        if path.is_dir():
+            try:
+                out.append(CacheEntry(path))
+            except FileNotFoundError:
+                # Removed while we were scanning
+                pass
+    out.sort(key=lambda e: e.last_access, reverse=True)
+    return out
+
+
+def size() -> int:
+    """Total size of the cache in bytes."""
+    return sum(e.size for e in entries())
+
+
+def _remove(entry: CacheEntry) -> bool:
+    """Delete an entry, unless it is being downloaded, or was used in the
+    last EVICT_GRACE_SECS and may be being read. Returns True if removed."""
+    with _locked(entry.path, blocking=False) as held:
+        if not held:
+            logger.debug(f"Not removing cache entry {entry.path}: in use")
+            return False
+        try:
+            if time.time() - _last_access(entry.path) < EVICT_GRACE_SECS:
+                logger.debug(f"Not removing cache entry {entry.path}: just used")
+                return False
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(entry.path, ignore_errors=True)
+    logger.info(
+        f"Removed cache entry {entry.path} ({entry.size / 1024 / 1024:.1f} MB, {entry.url})")
+    return True
+
+
+def prune(max_bytes: int | None = None,
+          older_than_mins: float | None = None,
+          keep: Path | None = None,
+          ) -> list[CacheEntry]:
+    """Evict cache entries, least recently used first.
+    Entries being downloaded by any process, or used in the last
+    EVICT_GRACE_SECS, are skipped.
+
+    Args:
+        max_bytes (int): Evict until the cache is no larger than this.
+        older_than_mins (float): Evict entries not used for this long.
+        keep (Path): Entry directory that must not be evicted.
+
+    Returns:
+        list[CacheEntry]: The entries that were removed.
+    """
+    return _prune(max_bytes, older_than_mins, keep)[0]
+
+
+def _prune(max_bytes: int | None = None,
+           older_than_mins: float | None = None,
+           keep: Path | None = None,
+           ) -> tuple[list[CacheEntry], int]:
+    """prune(), also returning the size of the entries that remain"""
+    removed = []
+    remaining = []
+    cutoff = None if older_than_mins is None else time.time() - older_than_mins * 60
+    for entry in entries():
+        if cutoff is not None and entry.last_access < cutoff and entry.path != keep and _remove(entry):
+            removed.append(entry)
+        else:
+            remaining.append(entry)
+    total = sum(e.size for e in remaining)
+    if max_bytes is not None:
+        # Oldest first
+        for entry in reversed(remaining):
+            if total <= max_bytes:
+                break
+            if entry.path == keep or not _remove(entry):
+                continue
+            removed.append(entry)
+            total -= entry.size
+    return removed, total
+
+
+def clear() -> int:
+    """Delete every cache entry, except those being downloaded or just used.
+    Returns the number removed."""
+    removed = 0
+    for entry in entries():
+        removed += _remove(entry)
+    return removed
+
+
+def _enforce_limit(keep: Path | None = None, added_bytes: int = 0) -> None:
+    """Apply UPDATABOT_CACHE_MAX_MB, if set, after a download of added_bytes.
+
+    Walking the cache costs a stat of every file in it, so each process keeps
+    a running estimate of the cache size instead, and only walks the cache
+    when that estimate goes over the limit, or is older than
+    SIZE_ESTIMATE_SECS and so may be missing other processes' downloads.
+    """
+    max_mb = os.environ.get('UPDATABOT_CACHE_MAX_MB')
+    if not max_mb:
+        return
+    max_bytes = int(float(max_mb) * 1024 * 1024)
+    cache_dir = str(_get_cache_dir())
+    with _size_estimates_guard:
+        estimate, estimated_at = _size_estimates.get(cache_dir, (None, 0.0))
+        now = time.monotonic()
+        if estimate is not None and now - estimated_at < SIZE_ESTIMATE_SECS:
+            estimate += added_bytes
+            if estimate <= max_bytes:
+                _size_estimates[cache_dir] = (estimate, estimated_at)
+                return
+        _, total = _prune(max_bytes=max_bytes, keep=keep)
+        _size_estimates[cache_dir] = (total, now)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line interface: python -m updatabot cache [list|prune|clear]"""
+    parser = argparse.ArgumentParser(
+        prog='python -m updatabot cache',
+        description=f"Manage the download cache in {_get_cache_dir()}")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='List cached downloads, most recently used first')
+    cmd_prune = commands.add_parser('prune', help='Evict least recently used downloads')
+    cmd_prune.add_argument('--max-mb', type=float,
+                           help='Evict until the cache is no larger than this')
+    cmd_prune.add_argument('--older-than-days', type=float,
+                           help='Evict downloads not used for this many days')
+    commands.add_parser('clear', help='Delete every cached download')
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        found = entries()
+        for entry in found:
+            print(entry)
+        total = sum(e.size for e in found)
+        print(f"{len(found)} entries, {total / 1024 / 1024:.1f} MB")
+    elif args.command == 'prune':
+        if args.max_mb is None and args.older_than_days is None:
+            parser.error('prune needs --max-mb or --older-than-days')
+        removed = prune(
+            max_bytes=None if args.max_mb is None else int(args.max_mb * 1024 * 1024),
+            older_than_mins=None if args.older_than_days is None else args.older_than_days * 24 * 60)
+        print(f"Removed {len(removed)} entries, {sum(e.size for e in removed) / 1024 / 1024:.1f} MB")
+    elif args.command == 'clear':
+        print(f"Removed {clear()} entries")
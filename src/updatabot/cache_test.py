@@ -0,0 +1,160 @@
+# Run with "pytest"
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from . import cache, nomis
+
+CODELIST_URL = nomis.api.BASE_URL + '/dataset/codelist/CL_162_1_AGE.def.sdmx.json'
+DATA_URL = nomis.api.BASE_URL + '/dataset/NM_162_1.data.csv'
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for var in ('UPDATABOT_CACHE_TTL', 'UPDATABOT_CACHE_TTLS', 'UPDATABOT_CACHE_OFFLINE'):
+        monkeypatch.delenv(var, raising=False)
+    yield
+    cache.clear_ttls()
+
+
+def test_ttl_defaults():
+    assert cache.get_ttl(DATA_URL) == 60
+    assert cache.get_ttl(CODELIST_URL) == 7 * 24 * 60
+
+
+def test_ttl_precedence(monkeypatch):
+    monkeypatch.setenv('UPDATABOT_CACHE_TTL', '5')
+    assert cache.get_ttl(DATA_URL) == 5
+    cache.set_ttl('www.nomisweb.co.uk', 30)
+    assert cache.get_ttl(DATA_URL) == 30
+    assert cache.get_ttl(CODELIST_URL) == 30
+    monkeypatch.setenv('UPDATABOT_CACHE_TTLS', r'\.csv=10')
+    assert cache.get_ttl(DATA_URL) == 10
+    assert cache.get_ttl(DATA_URL, ttl_mins=1) == 1
+
+
+def test_offline_never_expires(monkeypatch):
+    monkeypatch.setenv('UPDATABOT_CACHE_OFFLINE', '1')
+    assert cache.get_ttl(DATA_URL) == cache.NEVER_EXPIRE
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('UPDATABOT_CACHE_DIR', str(tmp_path))
+    # Three 1000-byte entries, last used at t=1000, 2000, 3000
+    for i in (1, 2, 3):
+        entry = tmp_path / f"entry{i}"
+        entry.mkdir()
+        (entry / 'data.csv').write_bytes(b'x' * 1000)
+        cache._write_meta(entry, {'url': f"https://example.com/{i}.csv"})
+        os.utime(cache._get_meta_path(entry), (i * 1000, i * 1000))
+    return tmp_path
+
+
+def test_entries(cache_dir):
+    found = cache.entries()
+    assert [e.url for e in found] == [
+        f"https://example.com/{i}.csv" for i in (3, 2, 1)]
+    assert all(e.size > 1000 for e in found)
+
+
+def test_prune_lru(cache_dir):
+    cache._touch(cache_dir / 'entry1')
+    removed = cache.prune(max_bytes=2500)
+    assert [e.path.name for e in removed] == ['entry2']
+    assert sorted(p.name for p in cache_dir.iterdir()) == ['entry1', 'entry3']
+
+
+def test_prune_keep(cache_dir):
+    removed = cache.prune(max_bytes=0, keep=cache_dir / 'entry1')
+    assert len(removed) == 2
+    assert [p.name for p in cache_dir.iterdir()] == ['entry1']
+
+
+def test_prune_skips_locked_entries(cache_dir):
+    with cache._locked(cache_dir / 'entry1'):
+        removed = cache.prune(max_bytes=0)
+    assert sorted(e.path.name for e in removed) == ['entry2', 'entry3']
+    assert [p.name for p in cache_dir.iterdir()] == ['entry1']
+
+
+def test_prune_skips_entries_just_used(cache_dir):
+    cache._touch(cache_dir / 'entry1')
+    removed = cache.prune(max_bytes=0)
+    assert sorted(e.path.name for e in removed) == ['entry2', 'entry3']
+    assert [p.name for p in cache_dir.iterdir()] == ['entry1']
+
+
+def test_thread_locks_are_dropped(cache_dir):
+    for i in range(100):
+        with cache._locked(cache_dir / f"new{i}"):
+            pass
+    assert len(cache._thread_locks) == 0
+
+
+def test_enforce_limit_walks_cache_only_when_needed(cache_dir, monkeypatch):
+    monkeypatch.setenv('UPDATABOT_CACHE_MAX_MB', str(5000 / 1024 / 1024))
+    monkeypatch.setattr(cache, '_size_estimates', {})
+    walks = []
+    entries = cache.entries
+    monkeypatch.setattr(cache, 'entries', lambda: walks.append(1) or entries())
+    cache._enforce_limit()
+    cache._enforce_limit(added_bytes=1000)
+    assert len(walks) == 1
+    # Over the limit by our own count: walk, and evict
+    cache._enforce_limit(added_bytes=10_000)
+    assert len(walks) == 2
+    monkeypatch.setattr(cache, 'SIZE_ESTIMATE_SECS', 0)
+    cache._enforce_limit()
+    assert len(walks) == 3
+
+
+def test_lock_is_held_across_processes(cache_dir):
+    script = (
+        "import sys; from pathlib import Path; from updatabot import cache\n"
+        "with cache._locked(Path(sys.argv[1]), blocking=False) as held:\n"
+        "    print(held)")
+    env = {**os.environ, 'PYTHONPATH': str(Path(cache.__file__).parents[1])}
+
+    def other_process_gets_lock():
+        out = subprocess.run([sys.executable, '-c', script, str(cache_dir / 'entry1')],
+                             env=env, capture_output=True, text=True, check=True)
+        return out.stdout.strip() == 'True'
+    with cache._locked(cache_dir / 'entry1'):
+        assert not other_process_gets_lock()
+    assert other_process_gets_lock()
+
+
+def test_cli(cache_dir, capsys):
+    cache.main(['list'])
+    assert 'https://example.com/2.csv' in capsys.readouterr().out
+    cache.main(['clear'])
+    assert list(cache_dir.iterdir()) == []
+
+
+def test_parquet_safe(tmp_path):
+    safe = [
+        pd.DataFrame({'n': [1, 2], 'x': [0.5, np.nan], 'name': ['a', None]}),
+        pd.DataFrame({'c': pd.Categorical(['a', 'b', 'a']), 'i': pd.array([1, None, 3], dtype='Int64')}),
+        pd.DataFrame({'d': pd.to_datetime(['2020-01-01', '2021-01-01'])}),
+    ]
+    unsafe = [
+        # Parquet reads NaN in a string column back as None
+        pd.DataFrame({'name': ['a', np.nan]}),
+        pd.DataFrame({'c': pd.Categorical([1, 2, 1])}),
+        pd.DataFrame({'d': pd.to_datetime(['2020-01-01']).astype('datetime64[s]')}),
+        pd.DataFrame({'n': [1, 2]}, index=[5, 6]),
+        pd.DataFrame({0: [1, 2]}),
+        pd.DataFrame({'mixed': [1, 'a']}),
+    ]
+    assert all(cache._parquet_safe(df) for df in safe)
+    assert not any(cache._parquet_safe(df) for df in unsafe)
+    pytest.importorskip('pyarrow')
+    for df in safe:
+        df.to_parquet(tmp_path / 'df.parquet')
+        pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / 'df.parquet'), df)
@@ -0,0 +1,89 @@
+# Shared pytest fixtures
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from . import configure_session
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        if self.server.head_status:
+            self.server.hits.append(self.path)
+            self.send_error(self.server.head_status)
+            return
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        self.server.hits.append(self.path)
+        if self.server.failures.get(self.path):
+            self.server.failures[self.path] -= 1
+            self.send_error(503)
+            return
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and if_range and if_range != etag:
+            # Changed since the client's copy: send all of it
+            range_header = None
+        if range_header and self.server.accept_ranges:
+            self.server.ranges.append(range_header)
+            start, end = range_header.removeprefix('bytes=').split('-')
+            start, end = int(start), min(int(end), len(body) - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+            body = body[start:end + 1]
+        else:
+            self.send_response(200)
+        if self.server.accept_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """
+    A local HTTP server with an empty cache dir. Add to server.files to
+    serve a path, server.failures to make it fail with a 503 a few times,
+    and check server.hits for the paths requested.
+    Responses carry an ETag, and honour If-None-Match.
+    Range requests are served, and listed in server.ranges, unless
+    server.accept_ranges is set to False. If-Range is honoured.
+    Set server.head_status to fail HEAD requests with that status.
+    """
+    monkeypatch.setenv('UPDATABOT_CACHE_DIR', str(tmp_path / 'cache'))
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    httpd.files = {}
+    httpd.hits = []
+    httpd.failures = {}
+    httpd.accept_ranges = True
+    httpd.ranges = []
+    httpd.head_status = None
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    configure_session(retries=2, backoff_factor=0)
+    yield httpd
+    configure_session()
+    httpd.shutdown()
+    httpd.server_close()
@@ -0,0 +1,81 @@
+from typing import Dict, Mapping
+import pandas as pd
+
+# ---
+# Label code columns from a lookup, eg. {5: "Male", 6: "Female"}.
+#
+# Each column is decoded with one hash lookup per row (Index.get_indexer)
+# and no Python per-row mapping. The result is categorical, so a million
+# rows of "Female" cost a million small integers plus one string.
+# If the column is already categorical, only its categories are looked up.
+# ---
+
+
+def _as_series(mapping: Mapping | pd.Series) -> pd.Series:
+    if isinstance(mapping, pd.Series):
+        return mapping
+    return pd.Series(list(mapping.values()), index=list(mapping.keys()), dtype=object)
+
+
+def decode_column(codes: pd.Series, mapping: Mapping | pd.Series) -> pd.Series:
+    """
+    Map a column of codes to a categorical column of labels.
+    Codes missing from the mapping become NaN.
+
+    Args:
+        codes: The code column.
+        mapping: Code to label, as a dict or a Series indexed by code.
+    """
+    lookup = _as_series(mapping)
+    if not lookup.index.is_unique:
+        lookup = lookup[~lookup.index.duplicated()]
+    if isinstance(codes.dtype, pd.CategoricalDtype):
+        decoded = decode_column(pd.Series(codes.cat.categories), lookup)
+        labels = decoded.cat.categories
+        category_codes = decoded.cat.codes.to_numpy()
+        # -1 (NaN) stays NaN
+        rows = codes.cat.codes.to_numpy()
+        new_codes = category_codes.take(rows) if len(category_codes) else rows.copy()
+        new_codes[rows == -1] = -1
+        return pd.Series(pd.Categorical.from_codes(new_codes, labels),
+                         index=codes.index, name=codes.name)
+    # Labels can repeat (two codes, one name), but categories cannot
+    label_codes, labels = pd.factorize(lookup.to_numpy())
+    if not len(lookup):
+        return pd.Series(pd.Categorical([None] * len(codes), categories=labels),
+                         index=codes.index, name=codes.name)
+    positions = pd.Index(lookup.index).get_indexer(codes)
+    new_codes = label_codes.take(positions)
+    new_codes[positions == -1] = -1
+    return pd.Series(pd.Categorical.from_codes(new_codes, labels),
+                     index=codes.index, name=codes.name)
+
+
+def decode(df: pd.DataFrame, mappings: Dict[str, Mapping | pd.Series], suffix: str | None = '_NAME') -> pd.DataFrame:
+    """
+    Label the code columns of a DataFrame.
+
+    Args:
+        df: The DataFrame. It is not modified.
+        mappings: Code to label lookups, by column name. Columns that are
+            not in df are ignored.
+        suffix: Add each label column next to its code column, eg. SEX
+            gains SEX_NAME. Pass None to replace the code columns instead.
+
+    Returns:
+        A new DataFrame.
+    """
+    out = df.copy(deep=False)
+    for column, mapping in mappings.items():
+        if column not in out.columns:
+            continue
+        labels = decode_column(out[column], mapping)
+        if not suffix:
+            out[column] = labels
+            continue
+        name = f"{column}{suffix}"
+        if name in out.columns:
+            out[name] = labels
+        else:
+            out.insert(out.columns.get_loc(column) + 1, name, labels)
+    return out
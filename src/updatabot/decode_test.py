@@ -0,0 +1,29 @@
+# Run with "pytest"
+import pandas as pd
+
+from .decode import decode, decode_column
+
+
+def test_decode_column():
+    codes = pd.Series([5, 6, 6, 9, 5], name='SEX')
+    labels = decode_column(codes, {5: "Male", 6: "Female", 7: "Total"})
+    assert isinstance(labels.dtype, pd.CategoricalDtype)
+    assert labels.tolist()[:3] == ["Male", "Female", "Female"]
+    # Unknown codes become NaN
+    assert pd.isna(labels[3])
+
+
+def test_decode_categorical_and_repeated_labels():
+    codes = pd.Series([1, 2, 3, None], dtype='category')
+    labels = decode_column(codes, pd.Series(["A", "A", "B"], index=[1, 2, 3]))
+    assert labels.tolist()[:3] == ["A", "A", "B"]
+    assert list(labels.cat.categories) == ["A", "B"]
+    assert pd.isna(labels[3])
+
+
+def test_decode_frame():
+    df = pd.DataFrame({'SEX': [5, 6], 'OBS_VALUE': [10, 20]})
+    out = decode(df, {'SEX': {5: "Male", 6: "Female"}, 'AGE': {}})
+    assert list(out.columns) == ['SEX', 'SEX_NAME', 'OBS_VALUE']
+    assert list(df.columns) == ['SEX', 'OBS_VALUE']
+    assert decode(df, {'SEX': {5: "Male"}}, suffix=None)['SEX'].tolist()[0] == "Male"
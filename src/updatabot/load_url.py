@@ -1,20 +1,27 @@
 import pandas as pd
+import asyncio
+import functools
 import hashlib
+import io
 import os
+import threading
 import time
 import urllib.parse
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
 from dotenv import load_dotenv
 from .logger import logger
+from . import session
+from . import cache
+from .cache import _get_cache_dir
 
-UPDATABOT_USER_AGENT = 'updatabot/0.1 (https://github.com/updatabot/python-updatabot)'
+# Bytes read from the socket per write when streaming a download to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
 
-
-def _get_cache_dir() -> Path:
-    default_cache_dir = os.path.expanduser('~/.cache/updatabot')
-    outpath = os.environ.get('UPDATABOT_CACHE_DIR', default_cache_dir)
-    return Path(outpath)
+# With categorize=True, string columns where at most this fraction of
+# values are distinct become categoricals
+CATEGORIZE_MAX_RATIO = 0.5
 
 
 def _get_url_filename(url: str) -> str:
@@ -40,54 +47,263 @@ def _get_cache_path(url: str) -> str:
     return _get_cache_dir() / subdir / _get_url_filename(url)
 
 
-def _is_cached(url: str, timeoutMins: int = 60) -> bool:
+def _get_meta_path(url: str) -> Path:
+    """Sidecar file holding the HTTP validators for a cache entry"""
+    return cache._get_meta_path(_get_cache_path(url).parent)
+
+
+def _read_meta(url: str) -> dict:
+    return cache._read_meta(_get_cache_path(url).parent)
+
+
+def _write_meta(url: str, meta: dict) -> None:
+    cache._write_meta(_get_cache_path(url).parent, meta)
+
+
+def _is_cached(url: str, timeoutMins: float | None = None) -> bool:
+    """True if the URL is cached and younger than timeoutMins.
+    A stale entry is kept on disk, so that it can be revalidated.
+    If timeoutMins is None, the TTL comes from updatabot.cache.get_ttl()."""
+    timeoutMins = cache.get_ttl(url, timeoutMins)
     local_path = _get_cache_path(url)
     if os.path.exists(local_path):
         ageMins = (time.time() - os.path.getmtime(local_path)) / 60
         if ageMins < timeoutMins:
             logger.debug(f"Cache hit for {url} at {local_path}")
+            cache._touch(local_path.parent)
             return True
-        else:
-            os.remove(local_path)
-            os.rmdir(os.path.dirname(local_path))
-            logger.info(
-                f"Removed cached file {local_path} because it was {ageMins:.1f} minutes old")
-            return False
+        logger.debug(
+            f"Cache entry for {url} is stale ({ageMins:.1f} minutes old)")
+        return False
     logger.debug(f"Cache miss for {url}")
     return False
 
 
-def _ensure_cached(url: str, no_cache: bool = False) -> str:
+def _conditional_headers(url: str) -> dict:
+    """Headers to revalidate an existing cache entry, if we hold validators for it"""
+    if not _get_cache_path(url).exists():
+        return {}
+    meta = _read_meta(url)
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    return headers
+
+
+def _mark_revalidated(url: str, cache_path: Path) -> None:
+    """The server answered 304 Not Modified: keep the file, and mark it fresh"""
+    os.utime(cache_path)
+    meta = _read_meta(url)
+    meta['fetched_at'] = time.time()
+    _write_meta(url, meta)
+    logger.info(f"Revalidated {url}: not modified")
+
+
+def _finish_download(url: str, tmp_path: Path, cache_path: Path, headers,
+                     nbytes: int, sha256) -> None:
+    """Move a completed download into place, and record its validators"""
+    os.replace(tmp_path, cache_path)
+    _write_meta(url, {
+        'url': url,
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'content_length': headers.get('Content-Length'),
+        'size': nbytes,
+        'sha256': sha256.hexdigest(),
+        'fetched_at': time.time(),
+    })
+
+
+def _log_rate(url: str, nbytes: int, start: float) -> None:
+    elapsed = time.monotonic() - start
+    rate = nbytes / elapsed / 1024 / 1024 if elapsed > 0 else 0
+    logger.info(
+        f"Downloaded {nbytes / 1024 / 1024:.1f} MB in {elapsed:.1f}s ({rate:.1f} MB/s) from {url}")
+
+
+def _download(url: str, cache_path: Path, headers: dict | None = None) -> None:
+    """Stream a URL to disk without holding the body in memory.
+
+    Chunks are written to a temporary file alongside cache_path, which is
+    renamed into place once the download completes. A failed or interrupted
+    download never leaves a partial file at cache_path.
+
+    If headers make the request conditional and the server answers
+    304 Not Modified, the existing file is kept and marked fresh.
+    """
+    tmp_path = cache_path.with_name(cache._tmp_name(cache_path.name))
+    start = time.monotonic()
+    nbytes = 0
+    sha256 = hashlib.sha256()
+    try:
+        with session.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304:
+                _mark_revalidated(url, cache_path)
+                return
+            response.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    nbytes += len(chunk)
+            _finish_download(url, tmp_path, cache_path, response.headers, nbytes, sha256)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    _log_rate(url, nbytes, start)
+
+
+async def _adownload(url: str, cache_path: Path, headers: dict | None = None) -> None:
+    """_download() on the event loop, through aiohttp. Only writes to the
+    temporary file block, one chunk at a time."""
+    tmp_path = cache_path.with_name(cache._tmp_name(cache_path.name))
+    start = time.monotonic()
+    nbytes = 0
+    sha256 = hashlib.sha256()
+    try:
+        async with session.aget(url, headers=headers) as response:
+            if response.status == 304:
+                _mark_revalidated(url, cache_path)
+                return
+            session._raise_for_status(response)
+            with open(tmp_path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    nbytes += len(chunk)
+            _finish_download(url, tmp_path, cache_path, response.headers, nbytes, sha256)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    _log_rate(url, nbytes, start)
+
+
+def _cached_path(url: str, no_cache: bool, ttl_mins: float | None) -> Path | None:
+    """The cached file, if it is fresh enough to use without asking the server"""
+    if _is_cached(url, ttl_mins) and not no_cache:
+        logger.debug(f"Using cached file {_get_cache_path(url)}")
+        return _get_cache_path(url)
+    if cache.is_offline():
+        raise ValueError(
+            f"Offline mode (UPDATABOT_CACHE_OFFLINE) is set, and {url} is not cached")
+    return None
+
+
+def _fetched_while_waiting(url: str, cache_path: Path, fetched_at: float | None,
+                           no_cache: bool, ttl_mins: float | None) -> bool:
+    """Called with the lock held: True if someone else fetched the URL while we waited"""
+    if cache_path.exists() and _read_meta(url).get('fetched_at') != fetched_at:
+        logger.debug(f"Using {url} just fetched by another caller")
+        return True
+    return _is_cached(url, ttl_mins) and not no_cache
+
+
+def _download_failed(cache_path: Path) -> None:
+    # Leave no lock file behind for a URL we never fetched
+    if not cache_path.exists():
+        (cache_path.parent / cache.LOCK_FILENAME).unlink(missing_ok=True)
+
+
+def _ensure_cached(url: str, no_cache: bool = False, ttl_mins: float | None = None) -> str:
     """Ensure that a URL is cached locally.
+    Stale entries are revalidated with If-None-Match / If-Modified-Since
+    where the server supplied an ETag or Last-Modified header.
+
+    Downloads are single-flight: the entry is locked across threads and
+    processes, and callers that wait on the lock use the download made
+    while they waited, rather than starting another.
 
     Args:
         url (str): URL to cache
         no_cache (bool): If True, redownload the file every time.
+        ttl_mins (float): Override the TTL policy for this call.
 
     Returns:
         str: Local path to the cached file
     """
-    if _is_cached(url) and not no_cache:
-        logger.debug(f"Using cached file {_get_cache_path(url)}")
-        return _get_cache_path(url)
+    cached = _cached_path(url, no_cache, ttl_mins)
+    if cached is not None:
+        return cached
+    cache_path = _get_cache_path(url)
+    fetched_at = _read_meta(url).get('fetched_at')
+    with cache._locked(cache_path.parent):
+        if _fetched_while_waiting(url, cache_path, fetched_at, no_cache, ttl_mins):
+            return cache_path
+        headers = {} if no_cache else _conditional_headers(url)
+        old_size = cache_path.stat().st_size if cache_path.exists() else 0
+        logger.info(f"Downloading {url} to {cache_path}")
+        try:
+            _download(url, cache_path, headers)
+        except BaseException:
+            _download_failed(cache_path)
+            raise
+        cache._enforce_limit(keep=cache_path.parent,
+                             added_bytes=cache_path.stat().st_size - old_size)
+    return cache_path
+
+
+async def _aensure_cached(url: str, no_cache: bool = False, ttl_mins: float | None = None) -> Path:
+    """_ensure_cached() for coroutines, sharing its cache entries and lock.
+    The download streams on the event loop. Without aiohttp, the sync
+    version runs in a worker thread instead."""
+    if not session._async_available():
+        return await asyncio.to_thread(_ensure_cached, url, no_cache, ttl_mins)
+    cached = _cached_path(url, no_cache, ttl_mins)
+    if cached is not None:
+        return cached
     cache_path = _get_cache_path(url)
-    # create the cache directory if it doesn't exist:
-    cache_path.parent.mkdir(parents=True, exist_ok=True)
-    # download the file:
-    logger.info(f"Downloading {url} to {cache_path}")
-    response = requests.get(url, headers={'User-Agent': UPDATABOT_USER_AGENT})
-    response.raise_for_status()
-    cache_path.write_bytes(response.content)
+    fetched_at = _read_meta(url).get('fetched_at')
+    async with cache._alocked(cache_path.parent):
+        if _fetched_while_waiting(url, cache_path, fetched_at, no_cache, ttl_mins):
+            return cache_path
+        headers = {} if no_cache else _conditional_headers(url)
+        old_size = cache_path.stat().st_size if cache_path.exists() else 0
+        logger.info(f"Downloading {url} to {cache_path}")
+        try:
+            await _adownload(url, cache_path, headers)
+        except BaseException:
+            _download_failed(cache_path)
+            raise
+        # As in _ensure_cached(), under the lock. Walking the cache blocks,
+        # so do it off the event loop.
+        await asyncio.to_thread(cache._enforce_limit, keep=cache_path.parent,
+                                added_bytes=cache_path.stat().st_size - old_size)
     return cache_path
 
 
-def _load_as_excel(local_path: Path, sheet_name: str = '') -> pd.DataFrame:
+_parse_pool: ThreadPoolExecutor | None = None
+_parse_pool_lock = threading.Lock()
+
+
+def _get_parse_pool() -> ThreadPoolExecutor:
+    """Workers for the parsing done by aload_url() and friends.
+    UPDATABOT_PARSE_WORKERS sets how many, by default one per CPU, so that
+    gathering many loads never starts more parses than the machine can run."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            workers = int(os.environ.get('UPDATABOT_PARSE_WORKERS', 0)) or os.cpu_count() or 1
+            _parse_pool = ThreadPoolExecutor(max_workers=workers,
+                                             thread_name_prefix='updatabot-parse')
+        return _parse_pool
+
+
+async def _run_parse(fn: Callable, *args, **kwargs):
+    """Run a blocking parse in the parse pool, and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_parse_pool(), functools.partial(fn, *args, **kwargs))
+
+
+def _load_as_excel(local_path: Path | BinaryIO, sheet_name: str = '', **read_options) -> pd.DataFrame:
     """Load an Excel file into a pandas DataFrame.
 
     Args:
-        local_path (Path): Local path to the Excel file
+        local_path (Path): Local path to the Excel file, or a binary stream
         sheet_name (str): Name of the sheet to load, or the sole sheet if empty.
         If the sheet is not found, or if there are multiple sheets, an error is raised.
+        read_options: Passed on to pd.read_excel, eg. usecols or dtype.
 
     Returns:
         pd.DataFrame: Loaded data
@@ -95,6 +311,10 @@ def _load_as_excel(local_path: Path, sheet_name: str = '') -> pd.DataFrame:
         ValueError: If the sheet is not found, or if there are multiple sheets.
         Error: If the file is not an Excel file.
     """
+    if not isinstance(local_path, (str, Path)):
+        # Excel readers seek all over the file. Seeking backwards in a
+        # compressed stream decompresses it again from the start.
+        local_path = io.BytesIO(local_path.read())
     excel_file = pd.ExcelFile(local_path)
     if sheet_name == '':
         if len(excel_file.sheet_names) > 1:
@@ -104,42 +324,150 @@ def _load_as_excel(local_path: Path, sheet_name: str = '') -> pd.DataFrame:
                 f"Multiple sheets found in Excel file. Please specify one of: {sheet_list}"
             )
         logger.debug(f"Loading single sheet from {local_path}")
-        return pd.read_excel(local_path)
+        return pd.read_excel(excel_file, **read_options)
     if not sheet_name in excel_file.sheet_names:
         raise ValueError(
             f"Sheet '{sheet_name}' not found in Excel file. Please specify one of: {excel_file.sheet_names}"
         )
     logger.debug(f"Loading sheet '{sheet_name}' from {local_path}")
-    return pd.read_excel(local_path, sheet_name=sheet_name)
+    return pd.read_excel(excel_file, sheet_name=sheet_name, **read_options)
+
+
+def _categorize(df: pd.DataFrame, max_ratio: float) -> pd.DataFrame:
+    """Convert string columns with few distinct values to categoricals.
+    ONS and NOMIS tables repeat the same labels on every row, and a
+    categorical stores each label once."""
+    if len(df) == 0:
+        return df
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+            if series.nunique(dropna=True) <= max_ratio * len(series):
+                df[col] = series.astype('category')
+    return df
+
+
+def _source_suffix(source: Path | BinaryIO) -> str:
+    """File extension of a path, or of the name of a stream, eg. a ZIP member"""
+    if isinstance(source, (str, Path)):
+        return Path(source).suffix
+    return Path(getattr(source, 'name', '') or '').suffix
 
 
-def _load_local_path(local_path: Path, file_extension: str = '', sheet_name: str = '') -> pd.DataFrame:
+def _load_local_path(local_path: Path | BinaryIO,
+                     file_extension: str = '',
+                     sheet_name: str = '',
+                     usecols: list[str] | None = None,
+                     dtype: dict | None = None,
+                     categorize: bool | float = False,
+                     engine: str | None = None,
+                     ) -> pd.DataFrame:
+    """Parse a file, or a binary stream such as an open ZIP member"""
     if not file_extension:
-        file_extension = local_path.suffix
-    if file_extension not in ['.csv', '.xlsx', '.xls', '.json']:
+        file_extension = _source_suffix(local_path)
+    if file_extension not in ['.csv', '.xlsx', '.xls', '.json', '.jsonl', '.ndjson']:
         raise ValueError(
-            f"Unsupported file extension: {file_extension}. Must be one of: .csv, .xlsx, .xls, .json. Pass file_extension='.csv' to force a particular parser.")
+            f"Unsupported file extension: {file_extension}. Must be one of: .csv, .xlsx, .xls, .json, .jsonl, .ndjson. Pass file_extension='.csv' to force a particular parser.")
+    if engine and file_extension != '.csv':
+        raise ValueError(f"engine='{engine}' is only supported for CSV files")
 
     if file_extension == '.csv':
         logger.debug(f"Loading as CSV: {local_path}")
-        return pd.read_csv(local_path)
+        df = pd.read_csv(local_path, usecols=usecols, dtype=dtype, engine=engine)
     elif file_extension in ('.xlsx', '.xls'):
         logger.debug(f"Loading as Excel: {local_path}")
-        return _load_as_excel(local_path, sheet_name)
+        df = _load_as_excel(local_path, sheet_name, usecols=usecols, dtype=dtype)
     elif file_extension == '.json':
         logger.debug(f"Loading as JSON: {local_path}")
-        return pd.read_json(local_path)
+        df = pd.read_json(local_path, dtype=dtype)
+    elif file_extension in ('.jsonl', '.ndjson'):
+        logger.debug(f"Loading as JSON lines: {local_path}")
+        df = pd.read_json(local_path, lines=True, dtype=dtype)
     else:
         raise ValueError('Unreachable')
 
+    if usecols is not None and file_extension in ('.json', '.jsonl', '.ndjson'):
+        # The JSON reader cannot skip columns, so drop them afterwards
+        df = df[list(usecols)]
+    if categorize:
+        max_ratio = CATEGORIZE_MAX_RATIO if categorize is True else categorize
+        df = _categorize(df, max_ratio)
+    return df
+
+
+def _iter_local_path(local_path: Path | BinaryIO,
+                     file_extension: str = '',
+                     chunksize: int = 100_000,
+                     usecols: list[str] | None = None,
+                     dtype: dict | None = None,
+                     ) -> Iterator[pd.DataFrame]:
+    """Parse a file or binary stream in chunks. Streams are not closed."""
+    if not file_extension:
+        file_extension = _source_suffix(local_path)
+    if file_extension == '.csv':
+        logger.debug(f"Iterating over CSV in chunks of {chunksize}: {local_path}")
+        reader = pd.read_csv(local_path, chunksize=chunksize,
+                             usecols=usecols, dtype=dtype)
+    elif file_extension in ('.jsonl', '.ndjson'):
+        if usecols is not None:
+            raise ValueError("usecols is not supported for JSON lines")
+        logger.debug(f"Iterating over JSON lines in chunks of {chunksize}: {local_path}")
+        reader = pd.read_json(local_path, lines=True,
+                              chunksize=chunksize, dtype=dtype)
+    else:
+        raise ValueError(
+            f"Cannot read {file_extension or getattr(local_path, 'name', local_path)} in chunks. Must be one of: .csv, .jsonl, .ndjson. Use load_url() to load the whole file.")
+    return _iter_reader(reader)
+
+
+def _iter_reader(reader) -> Iterator[pd.DataFrame]:
+    """Yield from a pandas chunked reader, closing the file when done"""
+    with reader:
+        yield from reader
+
+
+def _cached_frame(entry_dir: Path, parse: Callable[[], pd.DataFrame], **options) -> pd.DataFrame:
+    """A DataFrame parsed from an entry's download, memoised on disk in that
+    entry. The stored DataFrame is keyed on options and the content hash of
+    the download, so it is discarded when the download changes."""
+    key = None
+    if cache._parsed_enabled():
+        key = cache._parsed_key(entry_dir, **options)
+    if key:
+        df = cache._read_parsed_frame(entry_dir, key)
+        if df is not None:
+            logger.debug(f"Loaded parsed DataFrame for {entry_dir} {options} from cache")
+            return df
+    df = parse()
+    if key:
+        cache._write_parsed_frame(entry_dir, key, df)
+    return df
+
+
+def _load_parsed(local_path: Path, file_extension: str = '', sheet_name: str = '', **read_options) -> pd.DataFrame:
+    """_load_local_path(), memoised on disk next to the downloaded file."""
+    return _cached_frame(
+        local_path.parent,
+        lambda: _load_local_path(local_path, file_extension, sheet_name, **read_options),
+        file_extension=file_extension, sheet_name=sheet_name, **read_options)
+
 
 def load_url(url: str,
              file_extension: str = '',
              sheet_name: str = '',
-             no_cache: bool = False
+             no_cache: bool = False,
+             ttl_mins: float | None = None,
+             usecols: list[str] | None = None,
+             dtype: dict | None = None,
+             categorize: bool | float = False,
+             engine: str | None = None,
              ) -> pd.DataFrame:
     """Load data from a URL into a pandas DataFrame, with caching.
 
+    Both the download and the parsed DataFrame are cached. The parsed copy
+    is reused until the download changes, which skips slow CSV and Excel
+    parsing. Set UPDATABOT_PARSED_CACHE=0 to always re-parse.
+
     Args:
         url (str): URL pointing to a CSV, Excel, or JSON file.
 
@@ -151,6 +479,21 @@ def load_url(url: str,
 
         no_cache (bool): If True, redownload the file every time.
 
+        ttl_mins (float): Minutes before the cached file is revalidated.
+                          Defaults to the policy in updatabot.cache.get_ttl().
+
+        usecols (list[str]): Only load these columns.
+
+        dtype (dict): Column types, e.g. {'OBS_VALUE': 'float32', 'DATE': 'string'}.
+
+        categorize (bool | float): Convert repetitive string columns, like
+                          geography names, to categoricals to save memory.
+                          True converts columns where at most half the values
+                          are distinct. Pass a float to set that fraction.
+
+        engine (str): CSV parser: 'c' (default), 'python' or 'pyarrow'.
+                      'pyarrow' is multi-threaded, and requires pyarrow.
+
     Returns:
         pd.DataFrame: Loaded data
 
@@ -161,5 +504,77 @@ def load_url(url: str,
     logger.debug(
         f"Loading URL: {url} (sheet_name='{sheet_name}', no_cache={no_cache})")
 
-    local_path = _ensure_cached(url, no_cache)
-    return _load_local_path(local_path, file_extension, sheet_name)
+    local_path = _ensure_cached(url, no_cache, ttl_mins)
+    return _load_parsed(local_path, file_extension, sheet_name,
+                        usecols=usecols, dtype=dtype, categorize=categorize, engine=engine)
+
+
+def iter_url(url: str,
+             chunksize: int = 100_000,
+             file_extension: str = '',
+             no_cache: bool = False,
+             ttl_mins: float | None = None,
+             usecols: list[str] | None = None,
+             dtype: dict | None = None,
+             ) -> Iterator[pd.DataFrame]:
+    """Load data from a URL as a sequence of DataFrames, with caching.
+    Only one chunk is held in memory at a time, so files larger than
+    memory can be filtered, aggregated or written out as they stream.
+
+    Usage:
+        for chunk in updatabot.iter_url('https://...csv', chunksize=50_000):
+            ...
+
+    Args:
+        url (str): URL pointing to a CSV or JSON lines file.
+
+        chunksize (int): Number of rows in each DataFrame.
+
+        file_extension (str): Optional file extension to force, e.g. '.csv'.
+
+        no_cache (bool): If True, redownload the file every time.
+
+        ttl_mins (float): Minutes before the cached file is revalidated.
+
+        usecols (list[str]): Only load these columns. CSV only.
+
+        dtype (dict): Column types, as for load_url().
+
+    Returns:
+        Iterator[pd.DataFrame]: Chunks of at most chunksize rows
+
+    Raises:
+        ValueError: If the file is not CSV or JSON lines
+    """
+    load_dotenv()
+    logger.debug(f"Iterating over URL: {url} (chunksize={chunksize})")
+    local_path = _ensure_cached(url, no_cache, ttl_mins)
+    return _iter_local_path(local_path, file_extension, chunksize, usecols=usecols, dtype=dtype)
+
+
+async def aload_url(url: str,
+                    file_extension: str = '',
+                    sheet_name: str = '',
+                    no_cache: bool = False,
+                    ttl_mins: float | None = None,
+                    usecols: list[str] | None = None,
+                    dtype: dict | None = None,
+                    categorize: bool | float = False,
+                    engine: str | None = None,
+                    ) -> pd.DataFrame:
+    """Awaitable load_url(), taking the same arguments.
+
+    The download streams on the event loop (with aiohttp installed), into
+    the same on-disk cache as load_url(), so the two share entries. Only
+    parsing runs in a worker thread, from a pool of UPDATABOT_PARSE_WORKERS.
+
+    Usage:
+        dfs = await asyncio.gather(*(updatabot.aload_url(u) for u in urls))
+    """
+    load_dotenv()
+    logger.debug(
+        f"Loading URL: {url} (sheet_name='{sheet_name}', no_cache={no_cache})")
+
+    local_path = await _aensure_cached(url, no_cache, ttl_mins)
+    return await _run_parse(_load_parsed, local_path, file_extension, sheet_name,
+                            usecols=usecols, dtype=dtype, categorize=categorize, engine=engine)
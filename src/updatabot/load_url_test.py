@@ -0,0 +1,213 @@
+# Run with "pytest"
+import asyncio
+import importlib
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+import requests
+
+from . import cache, load_url, iter_url, aload_url, session
+from .load_url import _ensure_cached, _get_cache_path
+
+# The package re-exports load_url(), which shadows the module attribute
+load_url_module = importlib.import_module('updatabot.load_url')
+
+CSV = b"code,name\n1,Aged 16-24\n2,Aged 25-49\n3,Aged 50+\n"
+
+
+@pytest.fixture
+def server(server):
+    server.files['/data.csv'] = CSV
+    return server
+
+
+def test_load_url_caches(server):
+    df = load_url(server.url + '/data.csv')
+    assert list(df['name']) == ['Aged 16-24', 'Aged 25-49', 'Aged 50+']
+    load_url(server.url + '/data.csv')
+    assert server.hits == ['/data.csv']
+
+
+def test_aload_url_shares_the_cache(server):
+    server.files['/other.csv'] = CSV
+
+    async def main():
+        return await asyncio.gather(aload_url(server.url + '/data.csv'),
+                                    aload_url(server.url + '/other.csv', usecols=['name']))
+    data, other = asyncio.run(main())
+    assert list(other.columns) == ['name']
+    load_url(server.url + '/data.csv')
+    assert sorted(server.hits) == ['/data.csv', '/other.csv']
+
+
+def test_aload_url_downloads_without_threads(server, monkeypatch):
+    pytest.importorskip('aiohttp')
+    server.files['/other.csv'] = CSV
+
+    def no_sync_get(*args, **kwargs):
+        raise AssertionError("the sync session was used")
+    monkeypatch.setattr(session, 'get', no_sync_get)
+
+    async def main():
+        return await asyncio.gather(*(aload_url(server.url + path)
+                                      for path in ['/data.csv', '/data.csv', '/other.csv']))
+    first, again, other = asyncio.run(main())
+    assert list(first['name']) == list(other['name'])
+    assert sorted(server.hits) == ['/data.csv', '/other.csv']
+    # Stale: revalidated, and not modified
+    asyncio.run(aload_url(server.url + '/data.csv', ttl_mins=0))
+    assert server.hits[-1] == '/data.csv'
+    assert len(os.listdir(_get_cache_path(server.url + '/data.csv').parent / cache.PARSED_DIRNAME)) == 1
+
+
+def test_aload_url_retries_and_raises(server):
+    pytest.importorskip('aiohttp')
+    server.failures['/data.csv'] = 1
+    df = asyncio.run(aload_url(server.url + '/data.csv'))
+    assert len(df) == 3
+    assert server.hits == ['/data.csv', '/data.csv']
+    with pytest.raises(requests.HTTPError):
+        asyncio.run(aload_url(server.url + '/missing.csv'))
+    assert list(_get_cache_path(server.url + '/missing.csv').parent.iterdir()) == []
+
+
+def test_concurrent_requests_download_once(server, monkeypatch):
+    download = load_url_module._download
+
+    def slow_download(*args, **kwargs):
+        time.sleep(0.2)
+        download(*args, **kwargs)
+    monkeypatch.setattr(load_url_module, '_download', slow_download)
+    url = server.url + '/data.csv'
+    threads = [threading.Thread(target=_ensure_cached, args=(url,)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert server.hits == ['/data.csv']
+    # Waiters also share a download when no_cache is set
+    threads = [threading.Thread(target=_ensure_cached, args=(url, True)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(server.hits) == 2
+
+
+def test_download_is_streamed_to_disk(server, monkeypatch):
+    monkeypatch.setattr(load_url_module, 'DOWNLOAD_CHUNK_SIZE', 7)
+    server.files['/big.csv'] = CSV * 1000
+    path = _ensure_cached(server.url + '/big.csv')
+    assert path.read_bytes() == CSV * 1000
+    # No temporary files are left behind
+    assert sorted(p.name for p in path.parent.iterdir()) == [
+        '.lock', '.meta.json', 'big.csv']
+
+
+def test_failed_download_leaves_no_file(server):
+    url = server.url + '/missing.csv'
+    with pytest.raises(Exception):
+        _ensure_cached(url)
+    assert not _get_cache_path(url).exists()
+    assert list(_get_cache_path(url).parent.iterdir()) == []
+
+
+def test_download_retries_server_errors(server):
+    server.failures['/data.csv'] = 2
+    df = load_url(server.url + '/data.csv')
+    assert len(df) == 3
+    assert server.hits == ['/data.csv'] * 3
+
+
+def test_stale_entry_is_revalidated(server):
+    url = server.url + '/data.csv'
+    path = _ensure_cached(url)
+    two_hours_ago = time.time() - 2 * 60 * 60
+    os.utime(path, (two_hours_ago, two_hours_ago))
+
+    # Unchanged on the server: 304, and the entry is fresh again
+    assert _ensure_cached(url) == path
+    assert server.hits == ['/data.csv'] * 2
+    assert path.stat().st_mtime > two_hours_ago
+    assert path.read_bytes() == CSV
+
+    # Changed on the server: the new body replaces the entry
+    os.utime(path, (two_hours_ago, two_hours_ago))
+    server.files['/data.csv'] = CSV + b"4,Aged 65+\n"
+    assert len(load_url(url)) == 4
+
+
+def test_offline_mode(server, monkeypatch):
+    url = server.url + '/data.csv'
+    path = _ensure_cached(url)
+    os.utime(path, (0, 0))
+    monkeypatch.setenv('UPDATABOT_CACHE_OFFLINE', '1')
+    assert _ensure_cached(url) == path
+    with pytest.raises(ValueError):
+        _ensure_cached(server.url + '/other.csv')
+    assert server.hits == ['/data.csv']
+
+
+def test_parsed_dataframe_is_cached(server, monkeypatch):
+    url = server.url + '/data.csv'
+    first = load_url(url)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('should not re-parse')
+    with monkeypatch.context() as m:
+        m.setattr(load_url_module.pd, 'read_csv', fail)
+        pd.testing.assert_frame_equal(load_url(url), first)
+
+    # A changed download is parsed afresh
+    server.files['/data.csv'] = CSV + b"4,Aged 65+\n"
+    assert len(load_url(url, no_cache=True)) == 4
+
+
+def test_parsed_cache_returns_what_was_parsed(server):
+    # Parquet reads a missing string back as None, not NaN
+    server.files['/gaps.csv'] = b"code,name\n1,Aged 16-24\n2,\n"
+    url = server.url + '/gaps.csv'
+    first = load_url(url)
+    second = load_url(url)
+    pd.testing.assert_frame_equal(first, second)
+    assert second['name'][1] is not None
+
+
+def test_parsed_cache_write_failure_is_a_miss(server, monkeypatch):
+    def full_disk(*args, **kwargs):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', full_disk)
+    monkeypatch.setattr(pd.DataFrame, 'to_pickle', full_disk)
+    url = server.url + '/data.csv'
+    assert len(load_url(url)) == 3
+    assert len(load_url(url)) == 3
+
+
+def test_iter_url(server):
+    server.files['/big.csv'] = b"n\n" + b"".join(b"%d\n" % i for i in range(10))
+    chunks = list(iter_url(server.url + '/big.csv', chunksize=4))
+    assert [len(c) for c in chunks] == [4, 4, 2]
+    assert list(pd.concat(chunks)['n']) == list(range(10))
+
+    server.files['/rows.jsonl'] = b'{"n": 1}\n{"n": 2}\n{"n": 3}\n'
+    chunks = list(iter_url(server.url + '/rows.jsonl', chunksize=2))
+    assert [len(c) for c in chunks] == [2, 1]
+
+    with pytest.raises(ValueError):
+        iter_url(server.url + '/data.csv', file_extension='.xlsx')
+
+
+def test_load_options(server):
+    server.files['/wide.csv'] = b"geography,sex,value\n" + \
+        b"Leeds,Male,1\nLeeds,Female,2\nYork,Male,3\nYork,Female,4\n"
+    url = server.url + '/wide.csv'
+    df = load_url(url, usecols=['geography', 'value'],
+                  dtype={'value': 'float32'}, categorize=True)
+    assert list(df.columns) == ['geography', 'value']
+    assert df['value'].dtype == 'float32'
+    assert df['geography'].dtype == 'category'
+    # Different options are parsed and cached separately
+    assert load_url(url)['geography'].dtype == object
@@ -1,33 +1,310 @@
 from dotenv import load_dotenv
 from .logger import logger
-from .load_url import _ensure_cached, _load_local_path
+from .load_url import (_aensure_cached, _cached_frame, _ensure_cached, _get_cache_path,
+                       _iter_local_path, _load_local_path, _run_parse)
+from .range_file import RangeFile, RangesUnsupported
+from . import cache
+from . import session
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Iterable, Iterator
+import numpy as np
 import pandas as pd
+import asyncio
+import bisect
+import fnmatch
+import hashlib
+import json
+import multiprocessing
+import shutil
+import time
 import zipfile
 
+# Bytes fetched from the end of a remote ZIP to read its central directory.
+# Bigger directories take a second request.
+REMOTE_TAIL_BYTES = 256 * 1024
+
+# Below this many uncompressed bytes in total, load_many() parses in threads.
+# Starting worker processes, and pickling every DataFrame back to this one,
+# would cost more than parsing in parallel saves.
+PROCESS_POOL_MIN_BYTES = 64 * 1024 * 1024
+
+# Members bigger than this, uncompressed, are not stored parsed in the cache
+# unless asked for: parsing them from the stream is what spares the disk
+PARSED_MEMBER_MAX_BYTES = 256 * 1024 * 1024
+
 
 class LocalZipFile:
-    def __init__(self, zip_ref: zipfile.ZipFile, unzip_to: Path):
+    """
+    A cached ZIP file. Members are parsed straight from the compressed
+    stream, without extracting them to disk.
+    """
+
+    def __init__(self, zip_ref: zipfile.ZipFile, unzip_to: Path | None = None, entry_dir: Path | None = None):
         self.zip_ref = zip_ref
-        self.unzip_to = unzip_to
+        # Cache directory for parsed members
+        self.entry_dir = entry_dir or Path(zip_ref.filename).parent
+        # Only used by extract()
+        self.unzip_to = unzip_to or self.entry_dir / 'unzipped'
+
+    def _open(self, path: str):
+        return self.zip_ref.open(path)
+
+    def _spec(self):
+        """Enough to reopen this ZIP in a worker process. See _open_spec()."""
+        return self.zip_ref.filename
 
     def contents(self) -> list[str]:
         """Returns a list of all files in the ZIP directory, including those in subdirectories.
         Paths are returned relative to the ZIP root."""
         return self.zip_ref.namelist()
 
-    def load(self, path: str, file_extension: str = '', sheet_name: str = '') -> pd.DataFrame:
+    def load(self, path: str, file_extension: str = '', sheet_name: str = '',
+             cache_parsed: bool | None = None, **read_options) -> pd.DataFrame:
         """Load a file from inside the ZIP file.
-        Parameters operate the same as load_url().
+        Parameters operate the same as load_url(), including
+        usecols, dtype, categorize and engine.
+
+        The member is decompressed as it is parsed. The parsed DataFrame
+        is cached alongside the ZIP file if cache_parsed is True, or by
+        default if the member is at most PARSED_MEMBER_MAX_BYTES uncompressed.
+        """
+        def parse() -> pd.DataFrame:
+            logger.debug(f"Parsing {path} from {self._spec()}")
+            with self._open(path) as f:
+                return _load_local_path(f, file_extension=file_extension, sheet_name=sheet_name, **read_options)
+        if cache_parsed is None:
+            cache_parsed = self.zip_ref.getinfo(path).file_size <= PARSED_MEMBER_MAX_BYTES
+        if not cache_parsed:
+            return parse()
+        return _cached_frame(self.entry_dir, parse,
+                             member=path, file_extension=file_extension, sheet_name=sheet_name, **read_options)
+
+    def iter(self, path: str, chunksize: int = 100_000, file_extension: str = '',
+             usecols: list[str] | None = None, dtype: dict | None = None) -> Iterator[pd.DataFrame]:
+        """Load a CSV or JSON lines file from inside the ZIP file, as a
+        sequence of DataFrames. Only one chunk is decompressed and held in
+        memory at a time, so members larger than memory or disk can be
+        processed. See iter_url().
+        """
+        f = self._open(path)
+        try:
+            chunks = _iter_local_path(f, file_extension, chunksize, usecols=usecols, dtype=dtype)
+        except BaseException:
+            f.close()
+            raise
+        return _iter_and_close(chunks, f)
+
+    def match(self, pattern: str = '*') -> list[str]:
+        """Files in the ZIP whose path matches a glob pattern, eg. "*.csv" or "data/TS0*.csv".
+        As with fnmatch, * also matches across "/"."""
+        return [name for name in self.contents()
+                if not name.endswith('/') and fnmatch.fnmatchcase(name, pattern)]
+
+    def load_many(self, paths: str | Iterable[str], max_workers: int | None = None,
+                  concat: bool = False, source_column: str = 'source',
+                  file_extension: str = '', sheet_name: str = '',
+                  **read_options) -> Dict[str, pd.DataFrame] | pd.DataFrame:
+        """Load many files from inside the ZIP file, in parallel.
+
+        Parsing is CPU-bound, so members are decompressed and parsed in a
+        pool of processes, each with its own handle on the ZIP file.
+        Every DataFrame is pickled back to this process, which costs about
+        as much memory and time as copying it once. Members totalling less
+        than PROCESS_POOL_MIN_BYTES uncompressed, where that and starting
+        the processes would outweigh the gain, are parsed in threads instead.
+
+        Worker processes are started with forkserver (or spawn, where that
+        is unavailable) rather than fork, so that they never inherit locks
+        held by other threads. As with any such pool, scripts calling this
+        need an `if __name__ == '__main__':` guard.
+
+        Parsed members are cached, as for load().
+
+        Args:
+            paths: Paths inside the ZIP, or a glob pattern, eg. "*.csv".
+            max_workers: Number of workers. Defaults to the number of CPUs.
+                Pass 1 to load in this thread.
+            concat: Return one DataFrame, with the path of each row's member
+                in source_column, rather than a dict.
+            source_column: Name of that column.
+            file_extension, sheet_name, read_options: As for load(),
+                including cache_parsed.
+
+        Returns:
+            DataFrames by path, in ZIP order for a pattern, or else in the order
+            given. Or with concat=True, one DataFrame.
         """
-        # Extract single file to a temporary path
-        temp_path = self.unzip_to / path
-        temp_path.parent.mkdir(parents=True, exist_ok=True)
-        self.zip_ref.extract(path, self.unzip_to)
-        return _load_local_path(temp_path, file_extension=file_extension, sheet_name=sheet_name)
+        paths = self.match(paths) if isinstance(paths, str) else list(dict.fromkeys(paths))
+        spec = self._spec()
+        args = [(spec, path, file_extension, sheet_name, read_options) for path in paths]
+        total_bytes = sum(self.zip_ref.getinfo(path).file_size for path in paths)
+        if max_workers == 1 or len(paths) <= 1:
+            frames = [self.load(path, file_extension, sheet_name, **read_options) for path in paths]
+        elif total_bytes < PROCESS_POOL_MIN_BYTES:
+            logger.debug(f"Loading {len(paths)} files from {spec} in threads")
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                frames = list(pool.map(
+                    lambda path: self.load(path, file_extension, sheet_name, **read_options), paths))
+        else:
+            logger.debug(f"Loading {len(paths)} files from {spec} in processes")
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=_mp_context()) as pool:
+                frames = list(pool.map(_load_member, args))
+        if not concat:
+            return dict(zip(paths, frames))
+        if not frames:
+            return pd.DataFrame({source_column: pd.Categorical([])})
+        df = pd.concat(frames, ignore_index=True)
+        # One small integer per row, rather than one string
+        sources = pd.Categorical.from_codes(
+            np.repeat(np.arange(len(paths)), [len(f) for f in frames]), categories=paths)
+        df.insert(0, source_column, sources)
+        return df
+
+    def load_all(self, pattern: str = '*', **kwargs) -> Dict[str, pd.DataFrame] | pd.DataFrame:
+        """Load every file matching a glob pattern. Takes the arguments of load_many()."""
+        return self.load_many(self.match(pattern), **kwargs)
+
+    def extract(self, path: str) -> Path:
+        """Extract a file to disk, for tools that need a real file. Returns its path."""
+        self.unzip_to.mkdir(parents=True, exist_ok=True)
+        return Path(self.zip_ref.extract(path, self.unzip_to))
+
+
+class RemoteZipFile(LocalZipFile):
+    """
+    A ZIP file read in place with HTTP Range requests. Only the central
+    directory and the members you load are downloaded, and they are kept
+    in the cache, so each is downloaded once. See load_zip(remote=True).
+    """
+
+    def __init__(self, range_file: RangeFile, entry_dir: Path):
+        super().__init__(zipfile.ZipFile(range_file, 'r'), entry_dir=entry_dir)
+        self.range_file = range_file
+        # Each member's local header and data run up to the next member,
+        # or to the central directory
+        offsets = sorted({i.header_offset for i in self.zip_ref.infolist()})
+        offsets.append(self.zip_ref.start_dir)
+        self._ranges = {}
+        for info in self.zip_ref.infolist():
+            end = offsets[bisect.bisect_right(offsets, info.header_offset)]
+            self._ranges[info.filename] = (info.header_offset, end)
 
+    def load(self, path: str, *args, **kwargs) -> pd.DataFrame:
+        # Reads, including of parsed copies, keep the entry from eviction
+        cache._touch(self.entry_dir)
+        return super().load(path, *args, **kwargs)
 
-def load_zip(url: str, no_cache: bool = False) -> LocalZipFile:
+    def _open(self, path: str):
+        cache._touch(self.entry_dir)
+        # Fetch the member in one request, rather than a request per read
+        if path in self._ranges:
+            self.range_file.fetch(*self._ranges[path])
+        return self.zip_ref.open(path)
+
+    def _spec(self):
+        # Worker processes fetch the members they load, into the same cache
+        return ('remote', self.range_file.url, self.range_file.size,
+                str(self.range_file.ranges_dir), self.range_file.validator, str(self.entry_dir))
+
+
+def _mp_context():
+    """Start workers without fork: a forked child inherits locks held by
+    other threads, eg. the HTTP session's or a cache entry's, and can hang"""
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+# Worker processes keep their ZIP handles open between members
+_worker_zips: dict = {}
+
+
+def _open_spec(spec) -> LocalZipFile:
+    if isinstance(spec, tuple) and spec[0] == 'remote':
+        _, url, size, ranges_dir, validator, entry_dir = spec
+        return RemoteZipFile(RangeFile(url, size, Path(ranges_dir), validator), Path(entry_dir))
+    return LocalZipFile(zipfile.ZipFile(spec, 'r'))
+
+
+def _load_member(args) -> pd.DataFrame:
+    spec, path, file_extension, sheet_name, read_options = args
+    if spec not in _worker_zips:
+        _worker_zips[spec] = _open_spec(spec)
+    return _worker_zips[spec].load(path, file_extension, sheet_name, **read_options)
+
+
+def _iter_and_close(chunks: Iterator[pd.DataFrame], f) -> Iterator[pd.DataFrame]:
+    with f:
+        yield from chunks
+
+
+def _if_range(meta: dict) -> str | None:
+    """Validator for If-Range. Weak ETags are not allowed there."""
+    etag = meta.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return meta.get('last_modified')
+
+
+def _open_remote(url: str, ttl_mins: float | None = None) -> RemoteZipFile | None:
+    """
+    Open a ZIP with HTTP Range requests, or return None if the server
+    cannot serve ranges of it, or refuses a HEAD request for it (as some
+    CDNs and presigned URLs do).
+
+    Remote ZIPs live in the "remote" directory of the URL's cache entry,
+    with their own .meta.json. Their HTTP validators are rechecked with a
+    HEAD request when that is older than the TTL, or when the fetched ranges
+    were discarded because the file changed while being read.
+    """
+    remote_dir = _get_cache_path(url).parent / cache.REMOTE_DIRNAME
+    ranges_dir = remote_dir / 'ranges'
+    with cache._locked(remote_dir):
+        meta = cache._read_meta(remote_dir)
+        ageMins = (time.time() - meta.get('fetched_at', 0)) / 60
+        if not meta or ageMins >= cache.get_ttl(url, ttl_mins) or not ranges_dir.is_dir():
+            if cache.is_offline():
+                if not meta:
+                    raise ValueError(
+                        f"Offline mode (UPDATABOT_CACHE_OFFLINE) is set, and {url} is not cached")
+            else:
+                response = session.head(url)
+                if 400 <= response.status_code < 500:
+                    logger.debug(f"HEAD {url} failed with {response.status_code}")
+                    return None
+                response.raise_for_status()
+                size = response.headers.get('Content-Length')
+                if not size or response.headers.get('Accept-Ranges', '').lower() == 'none':
+                    return None
+                validators = {
+                    'size': int(size),
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+                if any(meta.get(k) != v for k, v in validators.items()):
+                    logger.debug(f"{url} has changed: discarding fetched ranges")
+                    shutil.rmtree(ranges_dir, ignore_errors=True)
+                    shutil.rmtree(remote_dir / cache.PARSED_DIRNAME, ignore_errors=True)
+                meta = {'url': url, **validators, 'fetched_at': time.time()}
+                if validators['etag'] or validators['last_modified']:
+                    # We never hold the whole file to hash it. This stands in
+                    # for its content hash in parsed cache keys, and changes
+                    # whenever the file does.
+                    meta['sha256'] = hashlib.sha256(
+                        json.dumps(validators, sort_keys=True).encode()).hexdigest()
+                cache._write_meta(remote_dir, meta)
+        cache._touch(remote_dir)
+    range_file = RangeFile(url, meta['size'], ranges_dir, _if_range(meta))
+    try:
+        # The central directory is at the end. One request usually covers it.
+        range_file.fetch(meta['size'] - REMOTE_TAIL_BYTES, meta['size'])
+        return RemoteZipFile(range_file, remote_dir)
+    except RangesUnsupported:
+        return None
+
+
+def load_zip(url: str, no_cache: bool = False, ttl_mins: float | None = None,
+             remote: bool = False) -> LocalZipFile:
     """Load a ZIP file from a URL, with caching. Returns a
     LocalZipFile to extract dataframes from the content.
 
@@ -37,14 +314,45 @@ def load_zip(url: str, no_cache: bool = False) -> LocalZipFile:
     Args:
         url (str): URL pointing to a ZIP file.
         no_cache (bool): If True, redownload the file every time.
+        ttl_mins (float): Minutes before the cached file is revalidated.
+        remote (bool): Read the ZIP in place with HTTP Range requests,
+            downloading only its directory and the members you load.
+            Falls back to downloading the whole file if the server does
+            not support ranges. Cannot be combined with no_cache.
 
     Returns:
         LocalZipFile: Loads dataframes from the zip file.
+
+    Raises:
+        range_file.RemoteChanged: With remote=True, if the file changes on
+            the server while it is being read. Load it again.
     """
     load_dotenv()
     logger.debug(f"Loading ZIP file: {url}")
-    local_path = _ensure_cached(url, no_cache)
+    if remote and no_cache:
+        raise ValueError("remote=True reads ranges from the cache, so cannot be combined with no_cache=True")
+    if remote:
+        remote_zip = _open_remote(url, ttl_mins)
+        if remote_zip is not None:
+            return remote_zip
+        logger.info(f"{url} does not support range requests. Downloading all of it.")
+    local_path = _ensure_cached(url, no_cache, ttl_mins)
 
-    unzip_to = local_path.parent / 'unzipped'
     zip_ref = zipfile.ZipFile(local_path, 'r')
-    return LocalZipFile(zip_ref, unzip_to)
+    return LocalZipFile(zip_ref)
+
+
+async def aload_zip(url: str, no_cache: bool = False, ttl_mins: float | None = None,
+                    remote: bool = False) -> LocalZipFile:
+    """Awaitable load_zip(), sharing its cache. The download streams on the
+    event loop, and the ZIP directory is read in the parse pool.
+    With remote=True, range requests go through the blocking session, so
+    the whole call runs in a worker thread. Reading members from the
+    result is synchronous."""
+    if remote:
+        return await asyncio.to_thread(load_zip, url, no_cache, ttl_mins, remote)
+    load_dotenv()
+    logger.debug(f"Loading ZIP file: {url}")
+    local_path = await _aensure_cached(url, no_cache, ttl_mins)
+    zip_ref = await _run_parse(zipfile.ZipFile, local_path, 'r')
+    return LocalZipFile(zip_ref)
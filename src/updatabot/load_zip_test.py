@@ -0,0 +1,240 @@
+# Run with "pytest"
+import importlib
+import io
+import os
+import time
+import zipfile
+
+import pandas as pd
+import pytest
+
+from . import cache, load_zip
+from .range_file import RangeFile, RemoteChanged
+
+# The package re-exports load_zip(), which shadows the module attribute
+load_zip_module = importlib.import_module('updatabot.load_zip')
+
+CSV = b"code,name\n1,Aged 16-24\n2,Aged 25-49\n3,Aged 50+\n"
+
+
+def zip_bytes(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def server(server):
+    xlsx = io.BytesIO()
+    pd.DataFrame({'code': [1, 2]}).to_excel(xlsx, index=False)
+    server.files['/bulk.zip'] = zip_bytes({
+        'data/age.csv': CSV,
+        'data/age.jsonl': b'{"code": 1}\n{"code": 2}\n',
+        'data/age.xlsx': xlsx.getvalue(),
+    })
+    return server
+
+
+def test_load_members_without_extracting(server):
+    z = load_zip(server.url + '/bulk.zip')
+    assert z.contents() == ['data/age.csv', 'data/age.jsonl', 'data/age.xlsx']
+    assert list(z.load('data/age.csv')['name']) == ['Aged 16-24', 'Aged 25-49', 'Aged 50+']
+    assert list(z.load('data/age.jsonl')['code']) == [1, 2]
+    assert list(z.load('data/age.xlsx')['code']) == [1, 2]
+    assert not z.unzip_to.exists()
+
+
+def test_parsed_member_is_cached(server, monkeypatch):
+    z = load_zip(server.url + '/bulk.zip')
+    first = z.load('data/age.csv', usecols=['name'])
+
+    def fail(*args, **kwargs):
+        raise AssertionError('should load the parsed copy')
+    monkeypatch.setattr(z.zip_ref, 'open', fail)
+    pd.testing.assert_frame_equal(z.load('data/age.csv', usecols=['name']), first)
+
+
+def test_big_members_are_not_stored_parsed(server, monkeypatch):
+    monkeypatch.setattr(load_zip_module, 'PARSED_MEMBER_MAX_BYTES', 10)
+    z = load_zip(server.url + '/bulk.zip')
+    parsed_dir = z.entry_dir / cache.PARSED_DIRNAME
+    z.load('data/age.csv')
+    assert not parsed_dir.exists() or not any(parsed_dir.iterdir())
+    z.load('data/age.csv', cache_parsed=True)
+    assert len(list(parsed_dir.iterdir())) == 1
+
+
+def test_iter_member(server):
+    z = load_zip(server.url + '/bulk.zip')
+    chunks = list(z.iter('data/age.csv', chunksize=2))
+    assert [len(c) for c in chunks] == [2, 1]
+    with pytest.raises(ValueError):
+        z.iter('data/age.xlsx')
+
+
+def test_load_many(server, monkeypatch):
+    server.files['/census.zip'] = zip_bytes({
+        'TS001/': b'',
+        'TS001/ts001.csv': b"code,count\nE1,10\nE2,20\n",
+        'TS002/ts002.csv': b"code,count\nE1,30\n",
+        'README.txt': b"hello",
+    })
+    z = load_zip(server.url + '/census.zip')
+    assert z.match('*.csv') == ['TS001/ts001.csv', 'TS002/ts002.csv']
+
+    found = z.load_many('*.csv', max_workers=2)
+    assert list(found) == ['TS001/ts001.csv', 'TS002/ts002.csv']
+    assert list(found['TS002/ts002.csv']['count']) == [30]
+
+    # Big enough to be worth worker processes
+    monkeypatch.setattr(load_zip_module, 'PROCESS_POOL_MIN_BYTES', 0)
+    assert z.load_many('*.csv', max_workers=2).keys() == found.keys()
+
+    df = z.load_all('TS00*/*.csv', concat=True, max_workers=1)
+    assert list(df.columns) == ['source', 'code', 'count']
+    assert list(df['source']) == ['TS001/ts001.csv', 'TS001/ts001.csv', 'TS002/ts002.csv']
+    assert list(df['count']) == [10, 20, 30]
+
+
+def big_zip_bytes(value: bytes = b"1234567") -> bytes:
+    # A member too big to download whole
+    members = {'big.csv': b"x\n" + (value + b"\n") * 200_000, 'small.csv': CSV}
+    # Stored without compression, so the archive is really that big
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def big_zip(server):
+    server.files['/big.zip'] = big_zip_bytes()
+    return server
+
+
+def test_remote_zip_fetches_only_needed_ranges(big_zip):
+    url = big_zip.url + '/big.zip'
+    z = load_zip(url, remote=True)
+    assert z.contents() == ['big.csv', 'small.csv']
+    assert list(z.load('small.csv')['name']) == ['Aged 16-24', 'Aged 25-49', 'Aged 50+']
+    # HEAD, the tail holding small.csv and the directory. Never big.csv.
+    assert len(big_zip.hits) == 2
+    fetched = sum(p.stat().st_size for p in (z.entry_dir / 'ranges').iterdir())
+    assert fetched < len(big_zip.files['/big.zip']) / 4
+
+    # Ranges and the parsed member are reused by the next process
+    big_zip.hits.clear()
+    again = load_zip(url, remote=True)
+    assert list(again.load('small.csv')['code']) == [1, 2, 3]
+    assert big_zip.hits == []
+    assert len(again.load('big.csv')) == 200_000
+
+
+def test_remote_zip_load_many(big_zip, monkeypatch):
+    z = load_zip(big_zip.url + '/big.zip', remote=True)
+    df = z.load_all('*.csv', concat=True, max_workers=2)
+    assert df['source'].value_counts().to_dict() == {'big.csv': 200_000, 'small.csv': 3}
+    monkeypatch.setattr(load_zip_module, 'PROCESS_POOL_MIN_BYTES', 0)
+    df = z.load_all('*.csv', concat=True, max_workers=2, cache_parsed=False)
+    assert df['source'].value_counts().to_dict() == {'big.csv': 200_000, 'small.csv': 3}
+
+
+def test_remote_zip_falls_back_to_download(big_zip):
+    big_zip.accept_ranges = False
+    z = load_zip(big_zip.url + '/big.zip', remote=True)
+    assert not hasattr(z, 'range_file')
+    assert len(z.load('small.csv')) == 3
+    assert big_zip.ranges == []
+
+
+def test_remote_zip_falls_back_when_head_is_refused(big_zip):
+    big_zip.head_status = 403
+    z = load_zip(big_zip.url + '/big.zip', remote=True)
+    assert not hasattr(z, 'range_file')
+    assert len(z.load('small.csv')) == 3
+
+
+def test_remote_zip_entry_is_listed_and_kept_fresh(big_zip):
+    url = big_zip.url + '/big.zip'
+    z = load_zip(url, remote=True)
+    entry, = cache.entries()
+    assert entry.url == url
+    for path in (entry.path, z.entry_dir / cache.META_FILENAME):
+        os.utime(path, (0, 0))
+    assert cache.entries()[0].last_access == 0
+    z.load('small.csv')
+    assert cache.entries()[0].last_access > time.time() - 60
+    os.utime(z.entry_dir / cache.META_FILENAME, (0, 0))
+    # A parsed copy is a read too
+    z.load('small.csv')
+    assert cache.entries()[0].last_access > time.time() - 60
+
+
+def test_remote_zip_offline_reads_only_cached_ranges(big_zip, monkeypatch):
+    url = big_zip.url + '/big.zip'
+    load_zip(url, remote=True).load('small.csv')
+    big_zip.hits.clear()
+    monkeypatch.setenv('UPDATABOT_CACHE_OFFLINE', '1')
+    z = load_zip(url, remote=True)
+    assert len(z.load('small.csv', cache_parsed=False)) == 3
+    with pytest.raises(ValueError, match='not cached'):
+        z.load('big.csv')
+    assert big_zip.hits == []
+
+
+def test_remote_zip_rejects_no_cache(big_zip):
+    with pytest.raises(ValueError):
+        load_zip(big_zip.url + '/big.zip', remote=True, no_cache=True)
+
+
+def test_remote_zip_detects_change(big_zip):
+    url = big_zip.url + '/big.zip'
+    z = load_zip(url, remote=True)
+    big_zip.files['/big.zip'] = big_zip_bytes(b"7654321")
+    with pytest.raises(RemoteChanged):
+        z.load('big.csv')
+    assert not (z.entry_dir / 'ranges').exists()
+    # The next load checks the file again
+    again = load_zip(url, remote=True)
+    assert again.load('big.csv')['x'][0] == 7654321
+
+
+def test_range_file_reads_across_segments(big_zip):
+    url = big_zip.url + '/big.zip'
+    size = len(big_zip.files['/big.zip'])
+    z = load_zip(url, remote=True)
+    f = z.range_file
+    f.fetch(0, 100)
+    f.fetch(100, 200)
+    f.fetch(300, 400)
+    big_zip.ranges.clear()
+    f.seek(50)
+    assert f.read(300) == big_zip.files['/big.zip'][50:350]
+    # Only the gap between the segments
+    assert big_zip.ranges == ['bytes=200-299']
+    assert f.read(size) == big_zip.files['/big.zip'][350:]
+
+
+def test_range_file_reads_overlapping_segments(big_zip):
+    url = big_zip.url + '/big.zip'
+    body = big_zip.files['/big.zip']
+    z = load_zip(url, remote=True)
+    f = z.range_file
+    # Another process fetches an overlapping range at the same time
+    other = RangeFile(url, f.size, f.ranges_dir, f.validator)
+    f.fetch(0, 200)
+    other._fetch(100, 300)
+    big_zip.ranges.clear()
+    f.seek(0)
+    assert f.read(300) == body[:300]
+    assert big_zip.ranges == []
+    for segments in (f._segments, RangeFile(url, f.size, f.ranges_dir)._segments):
+        assert all(a[1] <= b[0] for a, b in zip(segments, segments[1:]))
+    # A span's file is evicted: the bytes still held elsewhere are not fetched again
+    (f.ranges_dir / '0-200').unlink()
+    f.seek(0)
+    assert f.read(300) == body[:300]
+    assert big_zip.ranges == ['bytes=0-99']
@@ -1,11 +1,15 @@
-from .codelist import codelist
-from .query import query
+from .codelist import codelist, codelists
+from .geography import geography
+from .query import query, aquery
 from .search import search
 from . import api
 
 __all__ = [
     "api",
+    "aquery",
     "codelist",
+    "codelists",
+    "geography",
     "query",
     "search",
 ]
@@ -1,51 +1,191 @@
-from ..load_url import _ensure_cached
+from ..load_url import _aensure_cached, _ensure_cached, _run_parse
+from .. import cache
+from ..memo import LRUCache
 from . import schema
 from urllib.parse import urlencode
-from typing import List
+from typing import Callable, List
+from pathlib import Path
 from updatabot import logger
+import functools
+import hashlib
 import json
-from pydantic import ValidationError
+import os
+import re
+import pydantic
+from pydantic import BaseModel, ValidationError
 from .schema.ResponseCodelist import Codelist
+from .schema.ResponseGeography import Codelist as GeographyCodelist
+from .schema import Lax
 # from .schema.ResponseDataset import KeyFamily
 
 BASE_URL = "https://www.nomisweb.co.uk/api/v01"
 
+# Metadata changes far less often than data. Stale entries are revalidated,
+# not redownloaded, so these only bound how often we ask.
+# Override with updatabot.cache.set_ttl() or UPDATABOT_CACHE_TTLS.
+cache._set_default_ttl(
+    '^' + re.escape(BASE_URL) + r'/dataset/.*\.(sdmx|overview)\.json', 24 * 60)
+cache._set_default_ttl(
+    '^' + re.escape(BASE_URL) + r'/(dataset/codelist|concept)/', 7 * 24 * 60)
 
-def fetch(url: str) -> dict:
+# Parsed responses held in memory, keyed on (relative URL, disk cache key).
+# The disk cache key changes with the download, so a refreshed download is
+# never answered from memory.
+_memo = LRUCache(int(os.environ.get('UPDATABOT_NOMIS_MEMO_SIZE', 128)))
+
+
+def cache_info() -> dict:
+    """Hit and miss counters for the in-memory cache of parsed responses."""
+    return _memo.info()
+
+
+def cache_clear(url: str | None = None) -> int:
+    """
+    Drop parsed responses from memory: all of them, or those for one
+    relative URL, eg. "/dataset/def.sdmx.json". The disk cache is untouched.
+    Returns the number dropped.
+    """
+    if url is None:
+        return _memo.invalidate()
+    return _memo.invalidate(lambda key: key[0] == url)
+
+
+def _cached_parse(url: str, parse: Callable[[Path], object], ttl_mins: float | None = None,
+                  snapshot: type | None = None, **options) -> object:
+    """
+    Parse a cached response, remembering the result in memory, and on disk
+    as a snapshot of type `snapshot` if given. Both are keyed on the download's
+    content hash plus options, so they are discarded when the download changes.
+    """
+    local_path = _ensure_cached(BASE_URL + url, ttl_mins=ttl_mins)
+    return _parse_local(url, local_path, parse, snapshot, **options)
+
+
+async def _acached_parse(url: str, parse: Callable[[Path], object], ttl_mins: float | None = None,
+                         snapshot: type | None = None, **options) -> object:
+    """_cached_parse() for coroutines: downloads on the event loop, then
+    parses in the parse pool unless the memo already holds the result."""
+    local_path = await _aensure_cached(BASE_URL + url, ttl_mins=ttl_mins)
+    key = cache._parsed_key(local_path.parent, **options)
+    if key:
+        parsed = _memo.get((url, key))
+        if parsed is not None:
+            return parsed
+    return await _run_parse(_parse_local, url, local_path, parse, snapshot, **options)
+
+
+def _parse_local(url: str, local_path: Path, parse: Callable[[Path], object],
+                 snapshot: type | None = None, **options) -> object:
+    """The parsing half of _cached_parse(), once local_path is cached"""
+    entry_dir = local_path.parent
+    key = cache._parsed_key(entry_dir, **options)
+    if not key:
+        return parse(local_path)
+    parsed = _memo.get((url, key))
+    if parsed is not None:
+        return parsed
+    use_snapshot = snapshot is not None and cache._parsed_enabled()
+    if use_snapshot:
+        parsed = cache._read_parsed_object(entry_dir, key)
+        if isinstance(parsed, snapshot):
+            logger.debug(f"Loaded {snapshot.__name__} snapshot for {url}")
+        else:
+            parsed = None
+    if parsed is None:
+        parsed = parse(local_path)
+        if use_snapshot:
+            cache._write_parsed_object(entry_dir, key, parsed)
+    _memo.put((url, key), parsed)
+    return parsed
+
+
+def _load_json(local_path: Path) -> dict:
+    with open(local_path, 'r') as f:
+        return json.load(f)
+
+
+def fetch(url: str, ttl_mins: float | None = None) -> dict:
     """
     Get a JSON object from the NOMIS API.
-    The JSON object will be cached locally after the first request.
+    The JSON object will be cached locally after the first request,
+    and held in memory (see cache_info()). Do not modify it.
 
     Args:
         url: Relative URL, eg. "/dataset/def.sdmx.json"
+        ttl_mins: Override the cache TTL policy for this call.
 
     Returns:
         The JSON object.
     """
-    local_path = _ensure_cached(BASE_URL + url)
-    with open(local_path, 'r') as f:
-        return json.load(f)
+    return _cached_parse(url, _load_json, ttl_mins, format='json')
 
 
-def fetch_search(q=None) -> schema.ResponseDataset:
-    """Provide q=... to filter results. Otherwise all search hits are returned."""
-    if q:
-        obj = fetch(
-            f'/dataset/def.sdmx.json?{urlencode({"search": q})}')
-    else:
-        obj = fetch('/dataset/def.sdmx.json')
+def _validation(validation: str | None) -> str:
+    """
+    How thoroughly to validate responses:
 
-    parsed = schema.ResponseDataset(**obj)
-    return parsed
+    "strict": Every field is checked against the full schema, and unknown
+        fields are an error. Catches any change to the NOMIS API.
+    "lax": Only the fields our wrappers use are parsed. The rest are skipped
+        without building Python objects for them. Much faster on the full
+        catalogue and on large overviews.
+
+    Defaults to UPDATABOT_NOMIS_VALIDATION, or "strict".
+    """
+    if validation is None:
+        validation = os.environ.get('UPDATABOT_NOMIS_VALIDATION', 'strict')
+    if validation not in ('strict', 'lax'):
+        raise ValueError(
+            f"Unknown validation level {validation!r}. Must be 'strict' or 'lax'")
+    return validation
 
 
-def fetch_dataset(id: str) -> schema.ResponseDataset:
-    """A single-entry version of fetch_search, with the keyfamily extracted."""
-    obj = fetch(
-        f'/dataset/{id}.def.sdmx.json'
-    )
+@functools.cache
+def _schema_fingerprint(model: type[BaseModel]) -> str:
+    """Identifies a schema, so that snapshots of an older schema are never loaded"""
+    schema_json = json.dumps(model.model_json_schema(), sort_keys=True)
+    return f"{model.__module__}.{model.__qualname__}:{hashlib.sha256(schema_json.encode()).hexdigest()[:16]}"
+
+
+def _validator(strict: type[BaseModel], lax: type[BaseModel],
+               validation: str | None) -> tuple[Callable[[Path], BaseModel], dict]:
+    """A parse function for _cached_parse(), and the options that key its results"""
+    model = strict if _validation(validation) == 'strict' else lax
+
+    def parse(local_path: Path) -> BaseModel:
+        with open(local_path, 'rb') as f:
+            return model.model_validate_json(f.read())
+    return parse, {'snapshot': model,
+                   'schema': _schema_fingerprint(model),
+                   'pydantic': pydantic.VERSION}
+
+
+def _parse(url: str, strict: type[BaseModel], lax: type[BaseModel], validation: str | None) -> BaseModel:
+    """
+    Validate a cached response straight from its bytes, skipping json.load.
 
-    parsed = schema.ResponseDataset(**obj)
+    The parsed object is held in memory, and pickled next to the download so
+    that later processes load that snapshot instead of re-validating. Both
+    are tied to the download's content hash, the schema and the pydantic
+    version, so any change to those makes them rebuild.
+    """
+    parse, options = _validator(strict, lax, validation)
+    return _cached_parse(url, parse, **options)
+
+
+async def _aparse(url: str, strict: type[BaseModel], lax: type[BaseModel], validation: str | None) -> BaseModel:
+    """Awaitable _parse(), sharing its memo and snapshots"""
+    parse, options = _validator(strict, lax, validation)
+    return await _acached_parse(url, parse, **options)
+
+
+def _search_url(q) -> str:
+    if q:
+        return f'/dataset/def.sdmx.json?{urlencode({"search": q})}'
+    return '/dataset/def.sdmx.json'
+
+
+def _only_keyfamily(id: str, parsed: schema.ResponseDataset):
     keyfamilies = parsed.structure.keyfamilies
     if not keyfamilies:
         raise ValueError(f"NOMIS dataset not found: {id}")
@@ -55,32 +195,145 @@ def fetch_dataset(id: str) -> schema.ResponseDataset:
     return keyfamilies.keyfamily[0]
 
 
-def fetch_dataset_overview(id: str) -> schema.ResponseDatasetOverview:
+def _only_codelist(parsed):
+    """The sole codelist of a codelist or geography response, or None"""
+    if not parsed.structure.codelists:
+        return None
+    if len(parsed.structure.codelists.codelist) != 1:
+        raise ValueError(
+            f"Expected 1 codelist, got {len(parsed.structure.codelists.codelist)}")
+    return parsed.structure.codelists.codelist[0]
+
+
+def fetch_search(q=None, validation: str | None = None) -> schema.ResponseDataset:
+    """Provide q=... to filter results. Otherwise all search hits are returned.
+    Pass validation='lax' to parse the ~1600 entry catalogue quickly."""
+    parsed = _parse(_search_url(q), schema.ResponseDataset, Lax.LaxResponseDataset, validation)
+    return parsed
+
+
+def fetch_dataset(id: str, validation: str | None = None) -> schema.ResponseDataset:
+    """A single-entry version of fetch_search, with the keyfamily extracted."""
+    parsed = _parse(f'/dataset/{id}.def.sdmx.json',
+                    schema.ResponseDataset, Lax.LaxResponseDataset, validation)
+    return _only_keyfamily(id, parsed)
+
+
+def fetch_dataset_overview(id: str, validation: str | None = None) -> schema.ResponseDatasetOverview:
     """
     Main document for viewing a NOMIS dataset.
     Contains all the useful metadata, except the massive geography breakdown.
     """
-    obj = fetch(f'/dataset/{id}.overview.json')
-    parsed = schema.ResponseDatasetOverview(**obj)
+    parsed = _parse(f'/dataset/{id}.overview.json',
+                    schema.ResponseDatasetOverview, Lax.LaxResponseDatasetOverview, validation)
     return parsed
 
 
-def fetch_codelist(codelist_id: str) -> Codelist:
+def fetch_codelist(codelist_id: str, validation: str | None = None) -> Codelist:
     if not codelist_id:
         return None
-    obj = fetch(f'/dataset/codelist/{codelist_id}.def.sdmx.json')
-    parsed = schema.ResponseCodelist(**obj)
-    if not parsed.structure.codelists:
+    parsed = _parse(f'/dataset/codelist/{codelist_id}.def.sdmx.json',
+                    schema.ResponseCodelist, Lax.LaxResponseCodelist, validation)
+    return _only_codelist(parsed)
+
+
+def _geography_type(type: str | int | None) -> str:
+    """464, "464" and "TYPE464" all mean "TYPE464"."""
+    if type is None or type == '':
+        return ''
+    type = str(type).upper()
+    return type if type.startswith('TYPE') else f'TYPE{type}'
+
+
+def _geography_url(dataset_id: str, parent: str | int | None = None, type: str | int | None = None) -> str:
+    """
+    Relative URL of one node of a dataset's geography hierarchy:
+
+    /dataset/NM_1_1/geography.def.sdmx.json
+        Top-level areas, eg. United Kingdom, England, Wales
+    /dataset/NM_1_1/geography/2092957697.def.sdmx.json
+        The geography types available within England
+    /dataset/NM_1_1/geography/TYPE464.def.sdmx.json
+        Every area of that type
+    /dataset/NM_1_1/geography/2092957697TYPE464.def.sdmx.json
+        Every area of that type within England
+    """
+    node = f"{parent if parent is not None else ''}{_geography_type(type)}"
+    if not node:
+        return f'/dataset/{dataset_id}/geography.def.sdmx.json'
+    return f'/dataset/{dataset_id}/geography/{node}.def.sdmx.json'
+
+
+def fetch_geography(dataset_id: str, parent: str | int | None = None, type: str | int | None = None,
+                    validation: str | None = None) -> GeographyCodelist | None:
+    """
+    Get one node of the geography codelist for a dataset: the top-level areas,
+    or the areas of a type (eg. "TYPE464" or 464), optionally within a parent area.
+    See _geography_url() for the URLs.
+
+    This builds a pydantic object per area. For long lists (every LSOA, every
+    output area) use updatabot.nomis.geography(), which stores them compactly.
+    """
+    parsed = _parse(_geography_url(dataset_id, parent, type),
+                    schema.ResponseGeography, Lax.LaxResponseGeography, validation)
+    return _only_codelist(parsed)
+
+
+# ------- async -------
+# Awaitable versions of the fetchers above. Downloads stream on the event
+# loop, and validation runs in the parse pool. The disk cache, snapshots
+# and in-memory memo are shared with the sync versions.
+
+
+async def afetch(url: str, ttl_mins: float | None = None) -> dict:
+    """
+    Awaitable fetch(): get a JSON object from the NOMIS API.
+    Shares fetch()'s caches, so do not modify the result.
+
+    Args:
+        url: Relative URL, eg. "/dataset/def.sdmx.json"
+        ttl_mins: Override the cache TTL policy for this call.
+    """
+    return await _acached_parse(url, _load_json, ttl_mins, format='json')
+
+
+async def afetch_search(q=None, validation: str | None = None) -> schema.ResponseDataset:
+    """Awaitable fetch_search(). Provide q=... to filter results.
+    Pass validation='lax' to parse the ~1600 entry catalogue quickly."""
+    return await _aparse(_search_url(q), schema.ResponseDataset, Lax.LaxResponseDataset, validation)
+
+
+async def afetch_dataset(id: str, validation: str | None = None) -> schema.ResponseDataset:
+    """Awaitable fetch_dataset(): the keyfamily of a single dataset."""
+    parsed = await _aparse(f'/dataset/{id}.def.sdmx.json',
+                           schema.ResponseDataset, Lax.LaxResponseDataset, validation)
+    return _only_keyfamily(id, parsed)
+
+
+async def afetch_dataset_overview(id: str, validation: str | None = None) -> schema.ResponseDatasetOverview:
+    """Awaitable fetch_dataset_overview(): all the useful metadata of a
+    dataset, except the geography breakdown."""
+    return await _aparse(f'/dataset/{id}.overview.json',
+                         schema.ResponseDatasetOverview, Lax.LaxResponseDatasetOverview, validation)
+
+
+async def afetch_codelist(codelist_id: str, validation: str | None = None) -> Codelist:
+    """Awaitable fetch_codelist(). Returns None for an empty codelist_id,
+    or if NOMIS has no such codelist."""
+    if not codelist_id:
         return None
-    if len(parsed.structure.codelists.codelist) != 1:
-        raise ValueError(
-            f"Expected 1 codelist, got {len(parsed.structure.codelists.codelist)}")
-    return parsed.structure.codelists.codelist[0]
+    parsed = await _aparse(f'/dataset/codelist/{codelist_id}.def.sdmx.json',
+                           schema.ResponseCodelist, Lax.LaxResponseCodelist, validation)
+    return _only_codelist(parsed)
 
 
-def fetch_geography(dataset_id, parent=None):
-    """Get the geography codelist for a dataset."""
-    raise NotImplementedError("Not implemented")
+async def afetch_geography(dataset_id: str, parent: str | int | None = None, type: str | int | None = None,
+                           validation: str | None = None) -> GeographyCodelist | None:
+    """Awaitable fetch_geography(): one node of a dataset's geography
+    codelist. For long lists use updatabot.nomis.geography()."""
+    parsed = await _aparse(_geography_url(dataset_id, parent, type),
+                           schema.ResponseGeography, Lax.LaxResponseGeography, validation)
+    return _only_codelist(parsed)
 
 
 def fetch_concept(conceptref: str) -> str:
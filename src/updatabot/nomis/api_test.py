@@ -0,0 +1,176 @@
+# Run with "pytest"
+# Responses are built by codelist_json() and geography_json() below.
+import asyncio
+import json
+
+import pytest
+
+from . import api, codelist, codelists, geography
+from .codelist import NomisCodelist
+from .schema import ResponseCodelist
+from .search_test import keyfamily
+
+
+HEADER = {
+    "header": {
+        "id": "none", "prepared": "2025-03-10T00:00:00Z", "test": "false",
+        "sender": {"id": "NOMIS", "contact": {"email": "support@nomisweb.co.uk", "name": "Nomis"}},
+    },
+    "xmlns": "", "common": "", "structure": "", "xsi": "", "schemalocation": "",
+}
+
+
+def codelist_json(id, codes):
+    """A codelist response, as served by /dataset/codelist/{id}.def.sdmx.json"""
+    return json.dumps({"structure": {
+        **HEADER,
+        "codelists": {"codelist": [{
+            "agencyid": "NOMIS", "id": id, "uri": "",
+            "name": {"value": id.split('_')[-1].title(), "lang": "en"},
+            "code": [
+                {"description": {"value": name, "lang": "en"}, "value": value,
+                 **({"parentcode": parent} if parent is not None else {})}
+                for value, name, parent in codes
+            ],
+        }]},
+    }}).encode()
+
+
+AGE = [(0, "All categories: Age 16+", None),
+       (1, "Aged 16-24", 0),
+       (2, "Aged 25-49", 0),
+       (3, "Aged 50+", 0)]
+
+
+def geography_json(codes):
+    """A geography response: codes are (value, name, TypeCode, GeogCode)"""
+    return json.dumps({"structure": {**HEADER, "codelists": {"codelist": [{
+        "agencyid": "NOMIS", "id": "CL_1_1_GEOGRAPHY", "uri": "",
+        "name": {"value": "geography", "lang": "en"},
+        "code": [
+            {"value": value, "description": {"value": name, "lang": "en"},
+             "annotations": {"annotation": [
+                 {"annotationtitle": "TypeCode", "annotationtext": type_code},
+                 {"annotationtitle": "GeogCode", "annotationtext": geogcode},
+             ]}}
+            for value, name, type_code, geogcode in codes
+        ],
+    }]}}}).encode()
+
+
+@pytest.fixture
+def nomis_server(server, monkeypatch):
+    monkeypatch.setattr(api, 'BASE_URL', server.url)
+    api.cache_clear()
+    server.files['/dataset/codelist/CL_162_1_AGE.def.sdmx.json'] = codelist_json(
+        'CL_162_1_AGE', AGE)
+    return server
+
+
+def test_fetch_codelist(nomis_server):
+    for validation in ('strict', 'lax'):
+        codelist = api.fetch_codelist('CL_162_1_AGE', validation=validation)
+        assert [c.description.value for c in codelist.code][1] == "Aged 16-24"
+
+
+def test_parsed_snapshot(nomis_server, monkeypatch):
+    first = api.fetch_codelist('CL_162_1_AGE')
+
+    def fail(*args, **kwargs):
+        raise AssertionError('should load the snapshot')
+    monkeypatch.setattr(ResponseCodelist, 'model_validate_json', fail)
+    api.cache_clear()
+    assert api.fetch_codelist('CL_162_1_AGE') == first
+
+
+def test_memo(nomis_server):
+    first = api.fetch_codelist('CL_162_1_AGE')
+    before = api.cache_info()
+    assert api.fetch_codelist('CL_162_1_AGE') is first
+    assert api.cache_info()['hits'] == before['hits'] + 1
+
+    # A changed download is never answered from memory
+    url = '/dataset/codelist/CL_162_1_AGE.def.sdmx.json'
+    nomis_server.files[url] = codelist_json('CL_162_1_AGE', AGE[:2])
+    api.fetch(url, ttl_mins=0)
+    assert len(api.fetch_codelist('CL_162_1_AGE').code) == 2
+
+    # Old and new codelist, plus the JSON from fetch()
+    assert api.cache_clear(url) == 3
+
+
+def test_codelists(nomis_server):
+    kf = keyfamily("NM_162_1", "Claimant count", dimensions=['AGE', 'GEOGRAPHY'])
+    for id in ('CL_NM_162_1_TIME', 'CL_FREQ', 'CL_NM_162_1_MEASURES', 'CL_NM_162_1_AGE'):
+        nomis_server.files[f'/dataset/codelist/{id}.def.sdmx.json'] = codelist_json(id, AGE)
+    found = codelists(kf, max_workers=4)
+    assert sorted(found) == ['CL_FREQ', 'CL_NM_162_1_AGE',
+                             'CL_NM_162_1_MEASURES', 'CL_NM_162_1_TIME']
+    assert found['CL_NM_162_1_AGE'].name == 'Age'
+    # Each codelist is requested once, and geography is not requested
+    assert len(nomis_server.hits) == 4
+
+
+def test_codelists_are_shared(nomis_server):
+    status = {"assignmentstatus": "Mandatory", "attachmentlevel": "Observation",
+              "codelist": "CL_OBS_STATUS", "conceptref": "OBS_STATUS"}
+    for id in ('CL_NM_1_1_TIME', 'CL_NM_2_1_TIME', 'CL_FREQ', 'CL_NM_1_1_MEASURES',
+               'CL_NM_2_1_MEASURES', 'CL_OBS_STATUS'):
+        nomis_server.files[f'/dataset/codelist/{id}.def.sdmx.json'] = codelist_json(id, AGE)
+    first = codelists(keyfamily("NM_1_1", "JSA", attributes=[status]), include_attributes=True)
+    second = codelists(keyfamily("NM_2_1", "JSA", attributes=[status]), include_attributes=True)
+    assert 'CL_OBS_STATUS' in first
+    assert second['CL_FREQ'] is first['CL_FREQ']
+    assert second['CL_OBS_STATUS'] is first['CL_OBS_STATUS']
+    assert codelist('CL_FREQ') is first['CL_FREQ']
+    # CL_FREQ and CL_OBS_STATUS are requested once between the two datasets
+    assert len(nomis_server.hits) == 6
+
+
+def test_geography(nomis_server):
+    files = nomis_server.files
+    files['/dataset/NM_1_1/geography.def.sdmx.json'] = geography_json(
+        [(2092957697, "England", 499, "E92000001")])
+    files['/dataset/NM_1_1/geography/2092957697TYPE464.def.sdmx.json'] = geography_json(
+        [(1946157057, "Hartlepool", 464, "E06000001"),
+         (1946157058, "Middlesbrough", 464, "E06000002")])
+
+    top = geography('NM_1_1')
+    assert list(top) == [2092957697]
+    assert top.type(2092957697) == 'TYPE499'
+    # Lower levels are only requested when expanded
+    assert len(nomis_server.hits) == 1
+
+    las = top.within(2092957697, 464)
+    assert las.find("Middlesbrough") == 1946157058
+    assert las[1946157057] == "Hartlepool"
+    assert las.geogcode(1946157057) == "E06000001"
+    assert las.to_dataframe()['geogcode'].tolist() == ["E06000001", "E06000002"]
+    assert geography('NM_1_1', parent=2092957697, type='TYPE464') is las
+    assert len(nomis_server.hits) == 2
+
+    codelist = api.fetch_geography('NM_1_1', parent=2092957697, type='464')
+    assert [c.description.value for c in codelist.code] == ["Hartlepool", "Middlesbrough"]
+
+
+def test_codelist_lookups(nomis_server):
+    age = codelist('CL_162_1_AGE')
+    assert len(age) == 4 and 2 in age
+    assert age.find("Aged 50+").value == 3
+    assert age[1].parentcode == 0 and age[1].level == 1
+    assert [c.value for c in age.codes] == [0]
+    assert [c.value for c in age.descendants(0)] == [1, 2, 3]
+    assert [c.value for c in age.ancestors(2)] == [0]
+
+
+def test_codelist_drops_orphans_and_their_descendants():
+    codes = AGE + [(4, "Orphan", 99), (5, "Orphan's child", 4), (6, "Grandchild", 5)]
+    parsed = ResponseCodelist.model_validate_json(codelist_json('CL_162_1_AGE', codes))
+    age = NomisCodelist(parsed.structure.codelists.codelist[0])
+    assert len(age) == 4
+    assert [c.value for c in age.codes] == [0]
+
+
+def test_afetch_shares_memo(nomis_server):
+    first = asyncio.run(api.afetch_codelist('CL_162_1_AGE'))
+    assert api.fetch_codelist('CL_162_1_AGE') is first
@@ -1,6 +1,16 @@
-from . import api
-from .schema.ResponseCodelist import Codelist, Code
+from . import api, schema
+from .codetable import CodeTable
+from .schema import Lax
+from .schema.ResponseCodelist import Codelist
+from .schema.ResponseDataset import KeyFamily
 from updatabot import logger
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List
+import pandas as pd
+
+# Bump to invalidate snapshots stored by older versions
+CODELIST_VERSION = 1
 
 
 def indent(s: str, prefix: str = "  "):
@@ -8,11 +18,43 @@ def indent(s: str, prefix: str = "  "):
 
 
 class NomisCode:
-    def __init__(self, code: Code):
-        self.value = code.value
-        self.description = code.description.value
-        self.parentcode = code.parentcode
-        self.children = []
+    """A view of one row of a NomisCodelist. Cheap to create, holds no data."""
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table: CodeTable, row: int):
+        self._table = table
+        self._row = row
+
+    @property
+    def value(self) -> str | int:
+        return self._table.values[self._row]
+
+    @property
+    def description(self) -> str:
+        return self._table.names[self._row]
+
+    @property
+    def level(self) -> int:
+        return self._table.levels[self._row]
+
+    @property
+    def parentcode(self) -> str | int | None:
+        p = self._table.parents[self._row]
+        return None if p == -1 else self._table.values[p]
+
+    @property
+    def children(self) -> List['NomisCode']:
+        return [NomisCode(self._table, self._table.row(v))
+                for v in self._table.children(self.value)]
+
+    def __eq__(self, other):
+        return isinstance(other, NomisCode) and other._table is self._table and other._row == self._row
+
+    def __hash__(self):
+        return hash((id(self._table), self._row))
+
+    def __repr__(self):
+        return f"NomisCode({self.value!r}, {self.description!r})"
 
     def __str__(self):
         out = f"[{self.value}] \"{self.description}\""
@@ -21,24 +63,71 @@ class NomisCode:
         return out
 
 
-# TODO not sure if i'm using this
 class NomisCodelist:
+    """
+    A hierarchy of codes, stored as a CodeTable: lookups by value and by
+    description are O(1), and a codelist of tens of thousands of codes
+    costs a few lists rather than an object per code.
+    """
+
     def __init__(self, codelist: Codelist):
         # "CL_162_1_AGE"
         self.id = codelist.id
         # "Age"
         self.name = codelist.name.value
-        # Hierarchy of codes
-        tmp = {c.value: NomisCode(c) for c in codelist.code}
-        self.codes = []
-        for c in tmp.values():
-            if c.parentcode is None:
-                self.codes.append(c)
-            elif c.parentcode in tmp:
-                tmp[c.parentcode].children.append(c)
-            else:
+        known = {c.value for c in codelist.code}
+        codes = []
+        for c in codelist.code:
+            if c.parentcode is not None and c.parentcode not in known:
                 logger.warning(
                     'Dropping code %s because parent code %s not found in codelist %s', c.value, c.parentcode, self.id)
+            else:
+                codes.append(c)
+        # Their descendants go too, as when codes were nested under their parents
+        while True:
+            kept = {c.value for c in codes}
+            orphans = [c for c in codes if c.parentcode is not None and c.parentcode not in kept]
+            if not orphans:
+                break
+            for c in orphans:
+                logger.debug('Dropping code %s because parent code %s was dropped', c.value, c.parentcode)
+            codes = [c for c in codes if c.parentcode is None or c.parentcode in kept]
+        self.table = CodeTable([c.value for c in codes],
+                               [c.description.value for c in codes],
+                               [c.parentcode for c in codes])
+
+    @property
+    def codes(self) -> List[NomisCode]:
+        """Top-level codes. Their descendants are reached through .children."""
+        return [NomisCode(self.table, self.table.row(v)) for v in self.table.roots()]
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __iter__(self) -> Iterator[NomisCode]:
+        return (NomisCode(self.table, i) for i in range(len(self.table)))
+
+    def __contains__(self, value) -> bool:
+        return value in self.table
+
+    def __getitem__(self, value: str | int) -> NomisCode:
+        return NomisCode(self.table, self.table.row(value))
+
+    def find(self, description: str) -> NomisCode:
+        """The first code with this description. Raises KeyError if absent."""
+        return NomisCode(self.table, self.table.row_by_name(description))
+
+    def descendants(self, value: str | int) -> List[NomisCode]:
+        """Every code below this one, depth first"""
+        return [self[v] for v in self.table.descendants(value)]
+
+    def ancestors(self, value: str | int) -> List[NomisCode]:
+        """Parent, grandparent, ... up to the top level"""
+        return [self[v] for v in self.table.ancestors(value)]
+
+    def labels(self) -> pd.Series:
+        """Descriptions indexed by value, for NomisQuery.decode() or updatabot.decode"""
+        return self.table.labels()
 
     def __str__(self):
         codes = "\n".join([str(c) for c in self.codes])
@@ -46,5 +135,52 @@ class NomisCodelist:
 {codes}"""
 
 
-def codelist(id: str) -> NomisCodelist:
-    return NomisCodelist(api.fetch_codelist(id))
+def codelist(id: str, validation: str | None = None) -> NomisCodelist | None:
+    """
+    Load a codelist, eg. "CL_162_1_AGE". Returns None if NOMIS has no such codelist.
+
+    The NomisCodelist is cached on disk as a snapshot and held in memory, so
+    a codelist shared by many datasets, eg. CL_FREQ or CL_OBS_STATUS, is
+    downloaded and built once however often it is asked for.
+    """
+    validate, options = api._validator(schema.ResponseCodelist, Lax.LaxResponseCodelist, validation)
+
+    def parse(local_path: Path) -> NomisCodelist | None:
+        found = api._only_codelist(validate(local_path))
+        return None if found is None else NomisCodelist(found)
+    return api._cached_parse(f'/dataset/codelist/{id}.def.sdmx.json', parse,
+                             snapshot=NomisCodelist, codelist=CODELIST_VERSION,
+                             schema=options['schema'], pydantic=options['pydantic'])
+
+
+def codelists(dataset: str | KeyFamily, max_workers: int = 8, include_attributes: bool = False) -> Dict[str, NomisCodelist]:
+    """
+    Fetch every codelist used by a dataset, in parallel.
+
+    Codelists shared between the time, dimension and attribute components
+    are only fetched once, and each comes from codelist(), so those shared
+    between datasets are not fetched again either.
+    The geography dimension is skipped: it is too large to fetch as a codelist.
+
+    Args:
+        dataset: A dataset ID like "NM_162_1", or a keyfamily from nomis.api.
+        max_workers: Number of codelists to download at once.
+        include_attributes: Also fetch attribute codelists, eg. CL_OBS_STATUS.
+            They are the same for every dataset, so they are left out by default.
+
+    Returns:
+        Codelists by ID, eg. {"CL_162_1_AGE": NomisCodelist(...), ...}
+    """
+    keyfamily = api.fetch_dataset(dataset) if isinstance(dataset, str) else dataset
+    components = keyfamily.components
+    ids = [components.timedimension.codelist]
+    ids += [d.codelist for d in components.dimension if d.conceptref != 'GEOGRAPHY']
+    if include_attributes:
+        ids += [a.codelist for a in getattr(components, 'attribute', [])
+                if getattr(a, 'codelist', None)]
+    # Deduplicate, keeping order
+    ids = list(dict.fromkeys(ids))
+    logger.debug(f"Fetching {len(ids)} codelists for {keyfamily.id}")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        fetched = pool.map(codelist, ids)
+        return {id: c for id, c in zip(ids, fetched) if c is not None}
@@ -0,0 +1,151 @@
+from array import array
+from typing import Dict, Iterator, List, Sequence
+import pandas as pd
+
+
+class CodeTable:
+    """
+    A compact, read-only hierarchy of codes, stored as parallel arrays.
+
+    Row i holds values[i], names[i], the row of its parent (-1 for a root),
+    and its depth (0 for a root). Lookups by value and by name are O(1).
+    Extra per-row columns, eg. geography type codes, live in `columns`.
+
+    Tens of thousands of codes cost a few lists and arrays, rather than
+    one Python object (and one list of children) per code.
+    """
+    __slots__ = ('values', 'names', 'parents', 'levels', 'columns',
+                 '_by_value', '_by_name', '_child_offsets', '_child_rows')
+
+    def __init__(self,
+                 values: Sequence[str | int],
+                 names: Sequence[str],
+                 parent_values: Sequence[str | int | None] | None = None,
+                 columns: Dict[str, list] | None = None):
+        if len(values) != len(names):
+            raise ValueError("values and names must be the same length")
+        self.values = list(values)
+        self.names = list(names)
+        self.columns = columns or {}
+        self._by_value = {v: i for i, v in enumerate(self.values)}
+        # First row wins when names repeat
+        self._by_name = {}
+        for i, name in enumerate(self.names):
+            self._by_name.setdefault(name, i)
+
+        self.parents = array('i', [-1]) * len(self.values)
+        if parent_values is not None:
+            for i, parent in enumerate(parent_values):
+                if parent is not None:
+                    self.parents[i] = self._by_value.get(parent, -1)
+        self.levels = array('i', [-1]) * len(self.values)
+        for i in range(len(self.values)):
+            self._level(i)
+        self._child_offsets = None
+        self._child_rows = None
+
+    def _level(self, i: int) -> int:
+        # Walk up to the nearest row with a known level
+        path = []
+        while i != -1 and self.levels[i] == -1:
+            path.append(i)
+            i = self.parents[i]
+            if len(path) > len(self.values):
+                raise ValueError("Cycle in code hierarchy")
+        level = -1 if i == -1 else self.levels[i]
+        for j in reversed(path):
+            level += 1
+            self.levels[j] = level
+        return self.levels[path[0]] if path else level
+
+    def _build_children(self):
+        """Children of every row, in CSR form: rows _child_rows[_child_offsets[i]:_child_offsets[i+1]]"""
+        counts = array('i', [0]) * (len(self.values) + 1)
+        for parent in self.parents:
+            if parent != -1:
+                counts[parent + 1] += 1
+        for i in range(len(self.values)):
+            counts[i + 1] += counts[i]
+        rows = array('i', [0]) * counts[-1]
+        fill = array('i', counts[:-1])
+        for i, parent in enumerate(self.parents):
+            if parent != -1:
+                rows[fill[parent]] = i
+                fill[parent] += 1
+        self._child_offsets, self._child_rows = counts, rows
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __contains__(self, value) -> bool:
+        return value in self._by_value
+
+    def __iter__(self) -> Iterator[str | int]:
+        return iter(self.values)
+
+    def row(self, value: str | int) -> int:
+        """Row of a value. Raises KeyError if absent."""
+        return self._by_value[value]
+
+    def row_by_name(self, name: str) -> int:
+        """Row of the first code with this name. Raises KeyError if absent."""
+        return self._by_name[name]
+
+    def name(self, value: str | int) -> str:
+        return self.names[self._by_value[value]]
+
+    def value(self, name: str) -> str | int:
+        return self.values[self._by_name[name]]
+
+    def parent(self, value: str | int) -> str | int | None:
+        p = self.parents[self._by_value[value]]
+        return None if p == -1 else self.values[p]
+
+    def level(self, value: str | int) -> int:
+        return self.levels[self._by_value[value]]
+
+    def roots(self) -> List[str | int]:
+        return [v for v, p in zip(self.values, self.parents) if p == -1]
+
+    def children(self, value: str | int) -> List[str | int]:
+        if self._child_offsets is None:
+            self._build_children()
+        i = self._by_value[value]
+        rows = self._child_rows[self._child_offsets[i]:self._child_offsets[i + 1]]
+        return [self.values[r] for r in rows]
+
+    def descendants(self, value: str | int) -> List[str | int]:
+        """Every code below this one, depth first"""
+        out = []
+        stack = list(reversed(self.children(value)))
+        while stack:
+            v = stack.pop()
+            out.append(v)
+            stack.extend(reversed(self.children(v)))
+        return out
+
+    def ancestors(self, value: str | int) -> List[str | int]:
+        """Parent, grandparent, ... up to the root"""
+        out = []
+        p = self.parents[self._by_value[value]]
+        while p != -1:
+            out.append(self.values[p])
+            p = self.parents[p]
+        return out
+
+    def labels(self) -> pd.Series:
+        """Names indexed by value, for updatabot.decode"""
+        return pd.Series(self.names, index=self.values, dtype=object)
+
+    def __getstate__(self):
+        # Indexes are rebuilt on load: smaller snapshots, and fast enough
+        return (self.values, self.names, self.parents, self.levels, self.columns)
+
+    def __setstate__(self, state):
+        self.values, self.names, self.parents, self.levels, self.columns = state
+        self._by_value = {v: i for i, v in enumerate(self.values)}
+        self._by_name = {}
+        for i, name in enumerate(self.names):
+            self._by_name.setdefault(name, i)
+        self._child_offsets = None
+        self._child_rows = None
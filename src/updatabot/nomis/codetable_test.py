@@ -0,0 +1,36 @@
+# Run with "pytest"
+import pickle
+
+from .codetable import CodeTable
+
+
+def table():
+    return CodeTable(
+        values=[0, 1, 2, 3, 4],
+        names=["All", "Aged 16-24", "Aged 25-49", "Aged 16-17", "Aged 50+"],
+        parent_values=[None, 0, 0, 1, 0],
+        columns={'order': [5, 4, 3, 2, 1]})
+
+
+def test_lookups():
+    t = table()
+    assert len(t) == 5 and 3 in t and 9 not in t
+    assert t.name(2) == "Aged 25-49"
+    assert t.value("Aged 50+") == 4
+    assert t.columns['order'][t.row(1)] == 4
+
+
+def test_hierarchy():
+    t = table()
+    assert t.roots() == [0]
+    assert t.children(0) == [1, 2, 4]
+    assert t.descendants(0) == [1, 3, 2, 4]
+    assert t.ancestors(3) == [1, 0]
+    assert [t.level(v) for v in t] == [0, 1, 1, 2, 1]
+    assert t.parent(0) is None
+
+
+def test_pickle():
+    t = pickle.loads(pickle.dumps(table()))
+    assert t.value("Aged 16-17") == 3
+    assert t.children(1) == [3]
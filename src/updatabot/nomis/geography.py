@@ -0,0 +1,147 @@
+from . import api
+from .codetable import CodeTable
+from pathlib import Path
+from typing import Iterator
+import json
+import pandas as pd
+
+# ---
+# Geography codes for a NOMIS dataset, loaded one node of the hierarchy
+# at a time: the top-level areas, then the types of area within one of
+# them, then every area of a type within it. Each node is a separate,
+# separately cached request, so only the levels you expand are fetched.
+#
+# A node can hold hundreds of thousands of areas (every output area in
+# England), so it is read straight from the JSON into a CodeTable,
+# without building a pydantic object per area.
+# ---
+
+# Bump to invalidate snapshots stored by older versions
+GEOGRAPHY_VERSION = 1
+
+# Annotations kept against each area, and the column they are stored in
+ANNOTATION_COLUMNS = {
+    'GeogCode': 'geogcode',
+    'TypeCode': 'type',
+    'TypeName': 'type_name',
+}
+
+
+class NomisGeography:
+    """
+    One node of a dataset's geography hierarchy.
+
+    Iterate for the area values, which are what NomisQuery.geography() takes.
+    geo[value] is the area's name, and geo.find(name) its value.
+    """
+
+    def __init__(self, dataset_id: str, node: str, id: str, name: str, table: CodeTable):
+        self.dataset_id = dataset_id
+        # eg. "2092957697TYPE464", or "" for the top level
+        self.node = node
+        # eg. "CL_1_1_GEOGRAPHY"
+        self.id = id
+        self.name = name
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __iter__(self) -> Iterator[str | int]:
+        return iter(self.table)
+
+    def __contains__(self, value) -> bool:
+        return value in self.table
+
+    def __getitem__(self, value: str | int) -> str:
+        return self.table.name(value)
+
+    def find(self, name: str) -> str | int:
+        """Value of the first area with this name. Raises KeyError if absent."""
+        return self.table.value(name)
+
+    def geogcode(self, value: str | int) -> str | None:
+        """ONS code of an area, eg. "E92000001" for England"""
+        return self.table.columns['geogcode'][self.table.row(value)]
+
+    def type(self, value: str | int) -> str | None:
+        """Geography type of an area, eg. "TYPE499" for a country"""
+        type_code = self.table.columns['type'][self.table.row(value)]
+        return None if type_code is None else api._geography_type(type_code)
+
+    def types(self, value: str | int) -> 'NomisGeography':
+        """The types of area available within an area. Fetched on first use."""
+        return geography(self.dataset_id, parent=value)
+
+    def within(self, value: str | int, type: str | int) -> 'NomisGeography':
+        """Every area of a type within an area. Fetched on first use."""
+        return geography(self.dataset_id, parent=value, type=type)
+
+    def labels(self) -> pd.Series:
+        """Area names indexed by value, for NomisQuery.decode()"""
+        return self.table.labels()
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'value': self.table.values,
+            'name': self.table.names,
+            **{column: values for column, values in self.table.columns.items()},
+        })
+
+    def __str__(self):
+        out = f"NomisGeography[{self.dataset_id}/{self.node or 'geography'}] \"{self.name}\" ({len(self)} areas)"
+        for value in self.table.values[:10]:
+            out += f"\n  [{value}] \"{self[value]}\""
+        if len(self) > 10:
+            out += f"\n  ... {len(self) - 10} more"
+        return out
+
+
+def _parse_geography(dataset_id: str, node: str):
+    def parse(local_path: Path) -> NomisGeography:
+        with open(local_path, 'rb') as f:
+            obj = json.loads(f.read())
+        codelists = (obj['structure'].get('codelists') or {}).get('codelist') or []
+        if len(codelists) > 1:
+            raise ValueError(f"Expected 1 codelist, got {len(codelists)}")
+        codelist = codelists[0] if codelists else {}
+        codes = codelist.get('code') or []
+        values, names, parents = [], [], []
+        columns = {column: [] for column in ANNOTATION_COLUMNS.values()}
+        for code in codes:
+            values.append(code['value'])
+            names.append(code['description']['value'])
+            parents.append(code.get('parentcode'))
+            annotations = {a['annotationtitle']: a['annotationtext']
+                           for a in (code.get('annotations') or {}).get('annotation', [])}
+            for title, column in ANNOTATION_COLUMNS.items():
+                columns[column].append(annotations.get(title))
+        return NomisGeography(
+            dataset_id, node,
+            id=codelist.get('id', ''),
+            name=(codelist.get('name') or {}).get('value', ''),
+            table=CodeTable(values, names, parents, columns))
+    return parse
+
+
+def geography(dataset_id: str, parent: str | int | None = None, type: str | int | None = None,
+              ttl_mins: float | None = None) -> NomisGeography:
+    """
+    Load one node of a dataset's geography hierarchy.
+
+    geography("NM_1_1")
+        Top-level areas, eg. United Kingdom, England, Wales
+    geography("NM_1_1", parent=2092957697)
+        The types of area within England, eg. regions, local authorities
+    geography("NM_1_1", type="TYPE464")
+        Every local authority
+    geography("NM_1_1", parent=2092957697, type=464)
+        Every local authority in England
+
+    Each node is cached on disk, snapshotted in its compact form, and held in
+    memory, so expanding the same node again is cheap.
+    """
+    url = api._geography_url(dataset_id, parent, type)
+    node = f"{parent if parent is not None else ''}{api._geography_type(type)}"
+    return api._cached_parse(url, _parse_geography(dataset_id, node), ttl_mins,
+                             snapshot=NomisGeography, geography=GEOGRAPHY_VERSION)
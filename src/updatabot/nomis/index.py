@@ -0,0 +1,158 @@
+from ..load_url import _ensure_cached
+from .. import cache
+from .schema.ResponseDataset import KeyFamily
+from . import api
+from updatabot import logger
+from bisect import bisect_left
+from collections import defaultdict
+from typing import List
+import math
+import re
+import threading
+
+# ---
+# Local full-text index over the NOMIS dataset catalogue.
+#
+# The index is built once from /dataset/def.sdmx.json, stored next to the
+# cached download, and rebuilt whenever that download changes. It holds
+# the (lax) keyfamilies too, so a search never re-parses the catalogue.
+# ---
+
+CATALOGUE_URL = api.BASE_URL + '/dataset/def.sdmx.json'
+
+# Bump to invalidate indexes stored by older versions
+INDEX_VERSION = 2
+
+# A term found in the name counts three times as much as one in the description
+FIELD_WEIGHTS = {
+    'id': 4.0,
+    'name': 3.0,
+    'keywords': 2.0,
+    'description': 1.0,
+    'annotations': 1.0,
+    'dimensions': 1.0,
+}
+
+# Annotations that are worth searching. The rest are dates and counts.
+SEARCHABLE_ANNOTATIONS = {
+    'Mnemonic', 'SubDescription', 'Units', 'contenttype/sources',
+    'contenttype/geoglevel', 'contenttype/censusrelease',
+    'MetadataTitle', 'MetadataTitle0', 'MetadataTitle1', 'MetadataTitle2', 'MetadataTitle3',
+    'MetadataText', 'MetadataText0', 'MetadataText1', 'MetadataText2', 'MetadataText3',
+}
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(str(text).lower())
+
+
+def _fields(keyfamily: KeyFamily) -> dict:
+    """The searchable text of a keyfamily, by field"""
+    annotations = keyfamily.annotations.annotation
+    keywords = next(
+        (a.annotationtext for a in annotations if a.annotationtitle == 'Keywords'), '')
+    return {
+        'id': keyfamily.id,
+        'name': keyfamily.name.value,
+        'keywords': keywords or '',
+        'description': keyfamily.description.value if keyfamily.description else '',
+        'annotations': ' '.join(
+            str(a.annotationtext) for a in annotations
+            if a.annotationtitle in SEARCHABLE_ANNOTATIONS and a.annotationtext is not None),
+        'dimensions': ' '.join(d.conceptref for d in keyfamily.components.dimension),
+    }
+
+
+class NomisIndex:
+    """
+    Inverted index from tokens to datasets, with field-weighted TF-IDF ranking.
+    Query terms match any token they are a prefix of, so "popul" finds
+    "population", and every term must match.
+    """
+
+    def __init__(self, keyfamilies: List[KeyFamily]):
+        self.keyfamilies = list(keyfamilies)
+        self.ids = [k.id for k in self.keyfamilies]
+        # token -> {dataset index -> weighted term frequency}
+        postings = defaultdict(lambda: defaultdict(float))
+        for i, keyfamily in enumerate(keyfamilies):
+            for field, text in _fields(keyfamily).items():
+                for token in tokenize(text):
+                    postings[token][i] += FIELD_WEIGHTS[field]
+        self.postings = {t: dict(docs) for t, docs in postings.items()}
+        # Sorted, for prefix lookups
+        self.tokens = sorted(self.postings)
+
+    def _expand(self, term: str) -> List[str]:
+        """Every indexed token that starts with term"""
+        out = []
+        i = bisect_left(self.tokens, term)
+        while i < len(self.tokens) and self.tokens[i].startswith(term):
+            out.append(self.tokens[i])
+            i += 1
+        return out
+
+    def search(self, query: str, limit: int | None = None) -> List[tuple[str, float]]:
+        """
+        Returns (dataset id, score) pairs, best match first.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        n = len(self.ids)
+        scores = None
+        for term in terms:
+            term_scores = defaultdict(float)
+            for token in self._expand(term):
+                docs = self.postings[token]
+                idf = math.log(1 + n / len(docs))
+                for i, tf in docs.items():
+                    term_scores[i] = max(term_scores[i], idf * (1 + math.log(tf)))
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {i: s + term_scores[i]
+                          for i, s in scores.items() if i in term_scores}
+            if not scores:
+                return []
+        # An exact dataset ID goes first
+        needle = query.strip().upper()
+        ranked = sorted(scores.items(), key=lambda x: (
+            self.ids[x[0]] != needle, -x[1], x[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(self.ids[i], score) for i, score in ranked]
+
+
+_loaded: tuple[str, NomisIndex] | None = None
+_lock = threading.Lock()
+
+
+def load_index() -> NomisIndex:
+    """
+    Load the index of the full NOMIS catalogue, building it if the
+    catalogue download is new. Kept in memory for the rest of the process.
+    """
+    global _loaded
+    local_path = _ensure_cached(CATALOGUE_URL)
+    entry_dir = local_path.parent
+    key = cache._parsed_key(entry_dir, index=INDEX_VERSION)
+    # Entries without a content hash are not stored on disk, but are still
+    # kept in memory until the download changes
+    stat = local_path.stat()
+    memo_key = key or f"{local_path}:{stat.st_size}:{stat.st_mtime_ns}"
+    with _lock:
+        if _loaded and _loaded[0] == memo_key:
+            return _loaded[1]
+        index = cache._read_parsed_object(entry_dir, key) if key else None
+        if not isinstance(index, NomisIndex):
+            logger.info("Building local NOMIS search index")
+            resp = api.fetch_search(validation='lax')
+            keyfamilies = resp.structure.keyfamilies.keyfamily if resp.structure.keyfamilies else []
+            index = NomisIndex(keyfamilies)
+            if key:
+                cache._write_parsed_object(entry_dir, key, index)
+        _loaded = (memo_key, index)
+        return index
@@ -1,10 +1,59 @@
 from . import api
+from .geography import NomisGeography, geography
 from .schema.ResponseDatasetOverview import Overview, Analysis, Dimension, Code, DimensionGeographyType
+import asyncio
 import json
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
-from updatabot import load_url, logger
+from updatabot import aload_url, load_url, logger
+from ..decode import decode
+from ..load_url import _is_cached, _run_parse
+from typing import AsyncIterator, Dict, Iterator, Mapping
 import pandas as pd
 
+# NOMIS never returns more than this many rows from a single request
+MAX_RECORDS = 25000
+
+
+def _page_bounds(limit, page_size):
+    """Yield (offset, size) for each page of a result set"""
+    offset = 0
+    while limit is None or offset < limit:
+        size = page_size if limit is None else min(page_size, limit - offset)
+        yield offset, size
+        offset += size
+
+
+class _Throttle:
+    """Space out request start times across threads"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+
+    def delay(self) -> float:
+        """Claim the next start time, returning how long to wait for it"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.min_interval
+        return delay
+
+    def wait(self):
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def await_turn(self):
+        delay = self.delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
 
 def indent(s: str | list[str], prefix: str = "  "):
     if not isinstance(s, list):
@@ -21,6 +70,8 @@ def lpad(s: str, width: int):
 
 
 class NomisCode:
+    __slots__ = ('level', 'name', 'value', 'is_default')
+
     def __init__(self, code: Code, is_default: bool = False):
         self.level = code.level
         self.name = code.name
@@ -55,8 +106,14 @@ class NomisQueryDimension:
             tmp = dimension.codes.code
             if not isinstance(tmp, list):
                 tmp = [tmp]
+            defaults = set(self.defaults)
             self.values = [
-                NomisCode(c, is_default=c.value in self.defaults) for c in tmp]
+                NomisCode(c, is_default=c.value in defaults) for c in tmp]
+        # Lookups for filter(). The first code wins when names repeat.
+        self._by_value = {c.value: c for c in self.values}
+        self._by_name = {}
+        for c in self.values:
+            self._by_name.setdefault(c.name, c)
         # Applies to geography (1568 times) and a handful
         # of other examples (less than 50). Not sure if useful.
         self.types = []
@@ -64,6 +121,17 @@ class NomisQueryDimension:
             tmp = dimension.types.type
             self.types = tmp if isinstance(tmp, list) else [tmp]
 
+    def labels(self) -> pd.Series:
+        """Code names indexed by value, for decoding"""
+        return pd.Series([c.name for c in self.values],
+                         index=[c.value for c in self.values], dtype=object)
+
+    def code(self, value: str | int) -> NomisCode | None:
+        return self._by_value.get(value)
+
+    def find(self, name: str) -> NomisCode | None:
+        return self._by_name.get(name)
+
     def __str__(self):
         out = f'key: {json.dumps(self.key)}'
         if self.title.lower() != self.key.lower():
@@ -147,10 +215,27 @@ class NomisQuery:
         else:
             self.q_filters[key] = value
 
-    def geography(self, value: str):
+    def geography(self, value: str | int | None = None, type: str | int | None = None):
+        """
+        Filter to an area, eg. 2092957697 (England), to every area of a type,
+        eg. type="TYPE464", or to every area of a type within an area.
+        See .geographies() for the valid values.
+        """
+        if value is None and type is None:
+            raise ValueError("Must specify a value, a type, or both")
+        if type is not None:
+            value = f"{'' if value is None else value}{api._geography_type(type)}"
         self._append_filter('geography', value)
         return self
 
+    def geographies(self, parent: str | int | None = None, type: str | int | None = None) -> NomisGeography:
+        """
+        Browse the values accepted by .geography(): the top-level areas,
+        the types of area within a parent, or every area of a type.
+        See updatabot.nomis.geography().
+        """
+        return geography(self.id, parent=parent, type=type)
+
     def latest(self):
         self._append_filter('date', 'latest')
         return self
@@ -166,11 +251,12 @@ class NomisQuery:
         if key == 'time' or key == 'date':
             raise ValueError("use .latest() or .since() instead")
 
-        available = self.dimension(key).values
+        dimension = self.dimension(key)
+        available = dimension.values
         if name is not None:
             if value is not None:
                 raise ValueError("Must specify either name or value, not both")
-            match = next((x for x in available if x.name == name), None)
+            match = dimension.find(name)
             if match is None:
                 logger.error(f"Name {name} not found in dimension {key}")
                 available_names = [x.name for x in available]
@@ -178,7 +264,7 @@ class NomisQuery:
                 raise ValueError(f"Name {name} not found in dimension {key}")
             self._append_filter(key, match.value)
         elif value is not None:
-            match = next((x for x in available if x.value == value), None)
+            match = dimension.code(value)
             if match is None:
                 logger.error(f"Value {value} not found in dimension {key}")
                 available_values = [x.value for x in available]
@@ -189,13 +275,15 @@ class NomisQuery:
             raise ValueError("Must specify either name or value")
         return self
 
-    def csv_url(self, limit=None) -> str:
+    def csv_url(self, limit=None, offset=None) -> str:
         url = f"{api.BASE_URL}/dataset/{self.id}.data.csv"
 
         # Build query parameters
         params = {}
         if limit:
             params['RecordLimit'] = limit
+        if offset:
+            params['RecordOffset'] = offset
         # Add all filters from self.filters
         for k, v in self.q_filters.items():
             if isinstance(v, list):
@@ -212,12 +300,184 @@ class NomisQuery:
 
         return url
 
-    def dataframe(self, limit=None) -> pd.DataFrame:
-        url = self.csv_url(limit)
-        df = load_url(url)
-        if len(df) == 25000:
-            logger.warning(
-                f"NOMIS returned max limit of 25000 rows. Apply more filters to ensure you're getting all your data.")
+    def _fetch_page(self, offset: int, size: int, throttle: _Throttle | None = None) -> pd.DataFrame:
+        url = self.csv_url(size, offset)
+        # Only throttle real requests: cached pages load at full speed
+        if throttle and not _is_cached(url):
+            throttle.wait()
+        try:
+            df = load_url(url)
+        except pd.errors.EmptyDataError:
+            # Offset ran past the end of the result set
+            df = pd.DataFrame()
+        logger.debug(
+            f"Fetched {len(df)} rows of {self.id} at offset {offset}")
+        return df
+
+    async def _afetch_page(self, offset: int, size: int, throttle: _Throttle | None = None) -> pd.DataFrame:
+        url = self.csv_url(size, offset)
+        if throttle and not _is_cached(url):
+            await throttle.await_turn()
+        try:
+            df = await aload_url(url)
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame()
+        logger.debug(
+            f"Fetched {len(df)} rows of {self.id} at offset {offset}")
+        return df
+
+    def pages(self, limit=None, page_size=MAX_RECORDS, max_workers=1, min_interval=0.25) -> Iterator[pd.DataFrame]:
+        """
+        Yield the query results one page at a time, using RecordOffset to
+        step through result sets larger than NOMIS's 25000 row cap.
+        Each page has its own URL, so each page is cached separately and
+        a retry only downloads the pages that are missing.
+
+        Args:
+            limit: Stop after this many rows in total.
+            page_size: Rows per request, at most 25000.
+            max_workers: Number of pages to download in parallel.
+                Pages are always yielded in order.
+            min_interval: Minimum seconds between starting two downloads,
+                when max_workers > 1. Be polite to NOMIS.
+        """
+        if page_size > MAX_RECORDS:
+            raise ValueError(f"page_size cannot exceed {MAX_RECORDS}")
+        bounds = _page_bounds(limit, page_size)
+        if max_workers <= 1:
+            for offset, size in bounds:
+                df = self._fetch_page(offset, size)
+                # Skip the empty page after an exact multiple of page_size
+                if len(df) or offset == 0:
+                    yield df
+                if len(df) < size:
+                    return
+            return
+
+        # The total row count is unknown, so keep max_workers pages in
+        # flight and stop queueing more once a short page comes back.
+        throttle = _Throttle(min_interval)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = deque(
+                (offset, size, pool.submit(self._fetch_page, offset, size, throttle))
+                for offset, size in itertools.islice(bounds, max_workers))
+            while pending:
+                offset, size, future = pending.popleft()
+                df = future.result()
+                if len(df) or offset == 0:
+                    yield df
+                if len(df) < size:
+                    for _, _, f in pending:
+                        f.cancel()
+                    return
+                nxt = next(bounds, None)
+                if nxt:
+                    offset, size = nxt
+                    pending.append(
+                        (offset, size, pool.submit(self._fetch_page, offset, size, throttle)))
+
+    async def _apages(self, limit=None, page_size=MAX_RECORDS, max_workers=1,
+                      min_interval=0.25) -> AsyncIterator[pd.DataFrame]:
+        """.pages() for coroutines: up to max_workers pages download at once
+        as tasks on the event loop, rather than in threads."""
+        if page_size > MAX_RECORDS:
+            raise ValueError(f"page_size cannot exceed {MAX_RECORDS}")
+        bounds = _page_bounds(limit, page_size)
+        throttle = _Throttle(min_interval) if max_workers > 1 else None
+
+        def start(offset, size):
+            return offset, size, asyncio.ensure_future(self._afetch_page(offset, size, throttle))
+        pending = deque(start(offset, size)
+                        for offset, size in itertools.islice(bounds, max(max_workers, 1)))
+        try:
+            while pending:
+                offset, size, task = pending.popleft()
+                df = await task
+                if len(df) or offset == 0:
+                    yield df
+                if len(df) < size:
+                    return
+                nxt = next(bounds, None)
+                if nxt:
+                    pending.append(start(*nxt))
+        finally:
+            for _, _, task in pending:
+                task.cancel()
+
+    def decode(self, df: pd.DataFrame, mappings: Dict[str, Mapping | pd.Series] | None = None,
+               suffix: str | None = '_NAME') -> pd.DataFrame:
+        """
+        Label the code columns of a query result locally, so that you can
+        .select() only the lean code columns, eg. "sex", and still get names.
+        Each column gains a categorical {COLUMN}_NAME next to it.
+
+        Codes come from the overview. The geography dimension only lists its
+        top-level areas there, so pass more, eg.
+        mappings={'GEOGRAPHY': q.geographies(type=464).labels()}.
+        Codelists work too: {'AGE': nomis.codelist('CL_162_1_AGE').labels()}.
+
+        Args:
+            df: A result from .dataframe() or .pages().
+            mappings: Extra or replacement lookups, by column name.
+            suffix: Pass None to replace the code columns with labels.
+        """
+        lookups = {}
+        for column in df.columns:
+            # NOMIS already labelled it
+            if suffix and f"{column}{suffix}" in df.columns:
+                continue
+            try:
+                dimension = self.dimension(column)
+            except ValueError:
+                continue
+            if dimension.values:
+                lookups[column] = dimension.labels()
+        # Matched by column name, whatever its case
+        columns = {c.lower(): c for c in df.columns}
+        for key, mapping in (mappings or {}).items():
+            lookups[columns.get(key.lower(), key)] = mapping
+        return decode(df, lookups, suffix=suffix)
+
+    def dataframe(self, limit=None, paginate=False, max_workers=1, decode=False) -> pd.DataFrame:
+        """
+        Download the query results.
+
+        Args:
+            limit: Maximum number of rows to return.
+            paginate: Pass True to fetch every page of a large result set.
+                Otherwise a single request is made, and NOMIS truncates the
+                result at 25000 rows.
+            max_workers: With paginate=True, download this many pages in parallel.
+            decode: Add labels for code-only columns. See .decode().
+        """
+        if paginate:
+            pages = self.pages(limit, max_workers=max_workers)
+            df = pd.concat(list(pages), ignore_index=True)
+        else:
+            url = self.csv_url(limit)
+            df = load_url(url)
+            if len(df) == MAX_RECORDS:
+                logger.warning(
+                    f"NOMIS returned max limit of {MAX_RECORDS} rows. Apply more filters or pass paginate=True to ensure you're getting all your data.")
+        if decode:
+            df = self.decode(df)
+        return df
+
+    async def adataframe(self, limit=None, paginate=False, max_workers=1, decode=False) -> pd.DataFrame:
+        """Awaitable .dataframe(), taking the same arguments. Pages download
+        on the event loop, sharing the cache with .dataframe() and .pages().
+        Parsing, joining and decoding run in the parse pool."""
+        if paginate:
+            pages = [df async for df in self._apages(limit, max_workers=max_workers)]
+            df = await _run_parse(pd.concat, pages, ignore_index=True)
+        else:
+            url = self.csv_url(limit)
+            df = await aload_url(url)
+            if len(df) == MAX_RECORDS:
+                logger.warning(
+                    f"NOMIS returned max limit of {MAX_RECORDS} rows. Apply more filters or pass paginate=True to ensure you're getting all your data.")
+        if decode:
+            df = await _run_parse(self.decode, df)
         return df
 
 
@@ -228,3 +488,9 @@ def query(id: str) -> NomisQuery:
     overview = api.fetch_dataset_overview(id).overview
     # entry = api.fetch_search(q=id).response.results[0]
     return NomisQuery(overview)
+
+
+async def aquery(id: str) -> NomisQuery:
+    """Awaitable query()"""
+    overview = (await api.afetch_dataset_overview(id)).overview
+    return NomisQuery(overview)
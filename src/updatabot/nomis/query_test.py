@@ -0,0 +1,113 @@
+# Run with "pytest"
+# The overview is built locally, and the rows fixture stands in for NOMIS.
+import asyncio
+import importlib
+
+import pandas as pd
+import pytest
+
+from .query import NomisQuery
+from .schema.ResponseDatasetOverview import Overview
+
+# The package re-exports query(), which shadows the module attribute
+query_module = importlib.import_module('updatabot.nomis.query')
+
+OVERVIEW = {
+    "id": "NM_1_1",
+    "name": "Jobseeker's Allowance",
+    "status": "Current (being actively updated)",
+    "analyses": {"analysis": {"id": "NM_1_1", "code": 1, "name": "Claimants"}},
+    "analysisnumber": 1,
+    "dimensions": {"dimension": [
+        {
+            "name": "Sex", "concept": "sex", "size": 3, "internaltype": 1,
+            "codes": {"code": [
+                {"level": 1, "name": "Total", "value": 7},
+                {"level": 2, "name": "Male", "value": 5},
+                {"level": 2, "name": "Female", "value": 6},
+            ]},
+            "defaults": {"code": {"level": 1, "name": "Total", "value": 7}},
+        },
+    ]},
+    "units": {"unit": {"name": "Persons"}},
+    "coverage": "Great Britain",
+    "restricted": "false",
+    "datasetnumber": 1,
+    "contact": {"email": "support@nomisweb.co.uk", "name": "Nomis"},
+    "mnemonic": "jsa",
+}
+
+
+@pytest.fixture
+def q():
+    return NomisQuery(Overview(**OVERVIEW))
+
+
+@pytest.fixture
+def rows(monkeypatch):
+    """Serve a fake 60-row result set, honouring RecordLimit/RecordOffset"""
+    table = pd.DataFrame({"OBS_VALUE": range(60)})
+    urls = []
+
+    def fake_load_url(url):
+        urls.append(url)
+        params = dict(p.split('=') for p in url.split('?')[1].split('&'))
+        offset = int(params.get('RecordOffset', 0))
+        limit = int(params['RecordLimit'])
+        return table.iloc[offset:offset + limit].reset_index(drop=True)
+
+    async def fake_aload_url(url):
+        await asyncio.sleep(0)
+        return fake_load_url(url)
+
+    monkeypatch.setattr(query_module, 'load_url', fake_load_url)
+    monkeypatch.setattr(query_module, 'aload_url', fake_aload_url)
+    return urls
+
+
+def test_filter_by_name(q):
+    q.filter('sex', name='Female')
+    assert 'sex=6' in q.csv_url()
+
+
+def test_filter_by_value(q):
+    q.filter('sex', value=5)
+    assert 'sex=5' in q.csv_url()
+    with pytest.raises(ValueError):
+        q.filter('sex', value=8)
+
+
+def test_decode(q):
+    df = pd.DataFrame({"SEX": [5, 6, 7], "OBS_VALUE": [1, 2, 3]})
+    out = q.decode(df)
+    assert out["SEX_NAME"].tolist() == ["Male", "Female", "Total"]
+    out = q.decode(df, mappings={'sex': {5: "M"}}, suffix=None)
+    assert out["SEX"].tolist()[0] == "M"
+
+
+def test_pages(q, rows):
+    pages = list(q.pages(page_size=25))
+    assert [len(p) for p in pages] == [25, 25, 10]
+    assert 'RecordOffset' not in rows[0]
+    assert 'RecordOffset=50' in rows[2]
+
+
+def test_dataframe_paginate(q, rows):
+    df = q.dataframe(paginate=True)
+    assert list(df['OBS_VALUE']) == list(range(60))
+    df = q.dataframe(limit=30, paginate=True)
+    assert len(df) == 30
+
+
+def test_pages_concurrent(q, rows):
+    pages = list(q.pages(page_size=10, max_workers=4, min_interval=0))
+    assert [len(p) for p in pages] == [10] * 6
+    df = q.dataframe(paginate=True, max_workers=4)
+    assert list(df['OBS_VALUE']) == list(range(60))
+
+
+def test_adataframe_paginate(q, rows):
+    df = asyncio.run(q.adataframe(paginate=True, max_workers=4))
+    assert list(df['OBS_VALUE']) == list(range(60))
+    df = asyncio.run(q.adataframe(limit=30, paginate=True))
+    assert len(df) == 30
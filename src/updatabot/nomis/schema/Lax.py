@@ -0,0 +1,195 @@
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional, Union
+
+# ---
+# Lax versions of the NOMIS response schemas, for validation='lax'.
+#
+# These declare only the fields that the search, query and codelist
+# wrappers read, and silently skip everything else. Pydantic never builds
+# the skipped objects: the discriminated attribute union on every
+# keyfamily, the header, dozens of ui_* fields on every overview Code...
+#
+# The strict schemas alongside forbid unknown fields, so they catch
+# changes to the NOMIS API. These do not.
+# ---
+
+
+class LaxObject(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+
+class LanguageValue(LaxObject):
+    value: str
+
+
+# ------- /dataset/def.sdmx.json -------
+
+
+class DatasetAnnotation(LaxObject):
+    annotationtext: str | int | float | None
+    annotationtitle: str
+
+
+class DatasetAnnotations(LaxObject):
+    annotation: List[DatasetAnnotation]
+
+
+class DatasetDimension(LaxObject):
+    codelist: str
+    conceptref: str
+    isfrequencydimension: Optional[bool] = None
+
+
+class DatasetTimeDimension(LaxObject):
+    codelist: str
+
+
+class DatasetComponents(LaxObject):
+    dimension: List[DatasetDimension]
+    timedimension: DatasetTimeDimension
+
+
+class KeyFamily(LaxObject):
+    id: str
+    description: Optional[LanguageValue] = None
+    name: LanguageValue
+    components: DatasetComponents
+    annotations: DatasetAnnotations
+
+
+class KeyFamilies(LaxObject):
+    keyfamily: List[KeyFamily]
+
+
+class DatasetStructure(LaxObject):
+    keyfamilies: Optional[KeyFamilies] = None
+
+
+class LaxResponseDataset(LaxObject):
+    structure: DatasetStructure
+
+
+# ------- /dataset/{id}.overview.json -------
+
+
+class OverviewCode(LaxObject):
+    level: int
+    name: Union[str, int]
+    value: Union[str, int]
+
+
+class OverviewCodes(LaxObject):
+    code: Union[OverviewCode, List[OverviewCode]]
+
+
+class OverviewGeographyType(LaxObject):
+    name: str
+    value: str
+
+
+class OverviewGeographyTypes(LaxObject):
+    type: Union[OverviewGeographyType, List[OverviewGeographyType]]
+
+
+class OverviewDimension(LaxObject):
+    name: str
+    concept: str
+    codes: Optional[OverviewCodes] = None
+    defaults: Optional[OverviewCodes] = None
+    types: Optional[OverviewGeographyTypes] = None
+
+
+class OverviewDimensions(LaxObject):
+    dimension: List[OverviewDimension]
+
+
+class OverviewUnit(LaxObject):
+    name: str
+
+
+class OverviewUnits(LaxObject):
+    unit: Union[OverviewUnit, List[OverviewUnit]]
+
+
+class OverviewAnalysis(LaxObject):
+    id: str
+    name: str
+
+
+class OverviewAnalyses(LaxObject):
+    analysis: Union[OverviewAnalysis, List[OverviewAnalysis]]
+
+
+class Overview(LaxObject):
+    id: str
+    name: str
+    description: Optional[str] = ''
+    subdescription: Optional[str] = ''
+    status: str
+    firstreleased: Optional[str] = None
+    lastrevised: Optional[str] = None
+    lastupdated: Optional[str] = None
+    nextupdate: Optional[str] = None
+    keywords: Optional[str] = None
+    analyses: OverviewAnalyses
+    dimensions: OverviewDimensions
+    units: OverviewUnits
+
+
+class LaxResponseDatasetOverview(LaxObject):
+    overview: Overview
+
+
+# ------- /codelist/{id}.def.sdmx.json -------
+
+
+class CodelistCode(LaxObject):
+    description: LanguageValue
+    value: int | str
+    parentcode: Optional[int | str] = None
+
+
+class Codelist(LaxObject):
+    id: str
+    code: List[CodelistCode]
+    name: LanguageValue
+
+
+class Codelists(LaxObject):
+    codelist: List[Codelist]
+
+
+class CodelistStructure(LaxObject):
+    codelists: Optional[Codelists] = None
+
+
+class LaxResponseCodelist(LaxObject):
+    structure: CodelistStructure
+
+
+# ------- /dataset/{id}/geography/{parent}{type}.def.sdmx.json -------
+
+
+class GeographyCode(LaxObject):
+    description: LanguageValue
+    value: int | str
+    parentcode: Optional[int | str] = None
+    annotations: Optional[DatasetAnnotations] = None
+
+
+class GeographyCodelist(LaxObject):
+    id: str
+    code: List[GeographyCode]
+    name: LanguageValue
+
+
+class GeographyCodelists(LaxObject):
+    codelist: List[GeographyCodelist]
+
+
+class GeographyStructure(LaxObject):
+    codelists: Optional[GeographyCodelists] = None
+
+
+class LaxResponseGeography(LaxObject):
+    structure: GeographyStructure
@@ -1,8 +1,10 @@
 from .schema.ResponseDataset import KeyFamily
 from . import api
+from . import index
 import json
 from typing import List
 from collections import OrderedDict
+from functools import cached_property
 
 
 def indent(s: str, width: int = 2) -> str:
@@ -139,9 +141,14 @@ class NomisSearchHit:
     Represents a cleaned-up version of the JSON API response.
     A search hit has an ID, name, description, and some annotations.
     It lists the IDs of dimensions, which are a foreign key into Codelists.
+
+    Annotations, dimensions, status and keywords are read from the
+    keyfamily when first accessed, so a hit is cheap until then.
     """
 
     def __init__(self, keyfamily: KeyFamily):
+        self.keyfamily = keyfamily
+
         # Important!
         self.id = keyfamily.id
 
@@ -151,25 +158,22 @@ class NomisSearchHit:
         # eg. "Records the number of people claiming Jobseeker's..."
         self.description = keyfamily.description.value if keyfamily.description else None
 
-        self.annotations = NomisSearchHitAnnotations(keyfamily)
-        self.dimensions = NomisSearchHitDimensions(keyfamily)
-        self.is_current = None
-        current_annotation = next(
-            (a for a in keyfamily.annotations.annotation if a.annotationtitle == 'Status'), None)
-        if current_annotation:
-            text = current_annotation.annotationtext
-            if text == 'Current (being actively updated)':
-                self.is_current = True
-            elif text == 'Historical (not actively being updated)':
-                self.is_current = False
-            else:
-                raise ValueError(f"Unknown status: {text}")
-        keywords_annotation = next(
-            (a for a in keyfamily.annotations.annotation if a.annotationtitle == 'Keywords'), None)
-        if keywords_annotation:
-            self.keywords = keywords_annotation.annotationtext.split(',')
-        else:
-            self.keywords = []
+    @cached_property
+    def annotations(self) -> NomisSearchHitAnnotations:
+        return NomisSearchHitAnnotations(self.keyfamily)
+
+    @cached_property
+    def dimensions(self) -> NomisSearchHitDimensions:
+        return NomisSearchHitDimensions(self.keyfamily)
+
+    @cached_property
+    def is_current(self) -> bool | None:
+        return _is_current(self.keyfamily)
+
+    @cached_property
+    def keywords(self) -> List[str]:
+        keywords = _annotation(self.keyfamily, 'Keywords')
+        return keywords.split(',') if keywords else []
 
     def __stringpairs__(self):
         out = OrderedDict()
@@ -218,8 +222,81 @@ class NomisSearchHit:
         return "\n".join(html)
 
 
+STATUS_CURRENT = {
+    'Current (being actively updated)': True,
+    'Historical (not actively being updated)': False,
+}
+
+
+def _annotation(keyfamily: KeyFamily, title: str) -> str | None:
+    """Text of one annotation, read straight from the keyfamily"""
+    for a in keyfamily.annotations.annotation:
+        if a.annotationtitle == title:
+            return None if a.annotationtext is None else str(a.annotationtext)
+    return None
+
+
+def _is_current(keyfamily: KeyFamily) -> bool | None:
+    """The Status annotation as a bool, or None if absent"""
+    status = _annotation(keyfamily, 'Status')
+    if status is None:
+        return None
+    if status not in STATUS_CURRENT:
+        raise ValueError(f"Unknown status: {status}")
+    return STATUS_CURRENT[status]
+
+
+def _has_dimensions(keyfamily: KeyFamily, wanted: set[str]) -> bool:
+    present = {d.conceptref.lower() for d in keyfamily.components.dimension}
+    present.add('time')
+    return wanted <= present
+
+
 class NomisSearchResults(list):
-    """A list-like container for NomisSearchHit results that provides a combined HTML representation"""
+    """
+    A list-like container for NomisSearchHit results that provides a combined HTML representation.
+    Hits only read their annotations and dimensions when accessed, and filter() works on the
+    raw keyfamilies, so scanning the whole catalogue stays cheap.
+    """
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return NomisSearchResults(list.__getitem__(self, i))
+        return list.__getitem__(self, i)
+
+    @property
+    def ids(self) -> List[str]:
+        return [hit.id for hit in self]
+
+    def filter(self,
+               is_current: bool = None,
+               geoglevel: str = None,
+               census_release: str | int = None,
+               has_dimension: str | List[str] = None) -> 'NomisSearchResults':
+        """
+        Narrow down the results. Every condition given must hold.
+
+        Args:
+            is_current: True for current datasets, False for historical ones.
+            geoglevel: eg. "la2021". Matches the contenttype/geoglevel annotation.
+            census_release: eg. 2021. Matches the contenttype/censusrelease annotation.
+            has_dimension: A conceptref like "C_AGE", or a list which must all be present.
+        """
+        out = list(self)
+        if is_current is not None:
+            out = [h for h in out if _is_current(h.keyfamily) == is_current]
+        if geoglevel is not None:
+            out = [h for h in out
+                   if geoglevel.lower() in (_annotation(h.keyfamily, 'contenttype/geoglevel') or '').lower().split(',')]
+        if census_release is not None:
+            out = [h for h in out
+                   if _annotation(h.keyfamily, 'contenttype/censusrelease') == str(census_release)]
+        if has_dimension is not None:
+            if isinstance(has_dimension, str):
+                has_dimension = [has_dimension]
+            wanted = {d.lower() for d in has_dimension}
+            out = [h for h in out if _has_dimensions(h.keyfamily, wanted)]
+        return NomisSearchResults(out)
 
     def __str__(self):
         return "\n".join(f"-- NomisSearchHit {i+1}/{len(self)} --\n{hit}" for i, hit in enumerate(self))
@@ -230,25 +307,53 @@ class NomisSearchResults(list):
         return "<hr>".join(f"<p>NomisSearchHit {i+1}/{len(self)}</p>{hit._repr_html_()}" for i, hit in enumerate(self))
 
 
-def search(query: str = None, is_current: bool = None) -> NomisSearchResults:
+def search(query: str = None,
+           is_current: bool = None,
+           local: bool = False,
+           limit: int = None,
+           geoglevel: str = None,
+           census_release: str | int = None,
+           has_dimension: str | List[str] = None) -> NomisSearchResults:
     """
     Search for datasets by name or description.
     Returns results in a container that properly displays all hits in IPython/Jupyter.
+    Each hit reads its annotations and dimensions when they are accessed.
 
     Args:
         query: A string to search for.
         is_current: Pass True to only return current datasets, or False to return historical datasets.
+        local: Pass True to search a local index of the full catalogue instead of
+            asking NOMIS. Results are ranked by relevance, across names, descriptions,
+            keywords, annotations and dimensions, and work offline once cached.
+        limit: Return at most this many hits.
+        geoglevel, census_release, has_dimension: Further filters.
+            See NomisSearchResults.filter().
     """
-    if query:
-        # Force this to be a wildcard query for a friendly experience
-        if not query.startswith('*'):
-            query = '*' + query
-        if not query.endswith('*'):
-            query = query + '*'
-    resp = api.fetch_search(query)
-    keyfamilies = resp.structure.keyfamilies.keyfamily if resp.structure.keyfamilies else []
-    out = NomisSearchResults(NomisSearchHit(k) for k in keyfamilies)
-    if is_current is not None:
-        out = NomisSearchResults(
-            hit for hit in out if hit.is_current == is_current)
+    if local:
+        keyfamilies = _search_local(query)
+    else:
+        if query:
+            # Force this to be a wildcard query for a friendly experience
+            if not query.startswith('*'):
+                query = '*' + query
+            if not query.endswith('*'):
+                query = query + '*'
+        resp = api.fetch_search(query)
+        keyfamilies = resp.structure.keyfamilies.keyfamily if resp.structure.keyfamilies else []
+    out = NomisSearchResults(NomisSearchHit(k) for k in keyfamilies).filter(
+        is_current=is_current,
+        geoglevel=geoglevel,
+        census_release=census_release,
+        has_dimension=has_dimension)
+    if limit is not None:
+        out = out[:limit]
     return out
+
+
+def _search_local(query: str) -> List[KeyFamily]:
+    """Keyfamilies from the local index, best match first"""
+    local = index.load_index()
+    if not (query and query.strip('*')):
+        return local.keyfamilies
+    by_id = dict(zip(local.ids, local.keyfamilies))
+    return [by_id[id] for id, _ in local.search(query.strip('*'))]
@@ -0,0 +1,120 @@
+# Run with "pytest"
+# Searches run against a small hand-written catalogue.
+import json
+
+import pytest
+
+from . import api, index
+from .index import NomisIndex
+from .search import NomisSearchHit, NomisSearchResults, search
+from .schema.ResponseDataset import KeyFamily
+from .schema.Lax import KeyFamily as LaxKeyFamily
+
+
+def keyfamily(id, name, description=None, keywords=None, status='Current (being actively updated)', dimensions=(),
+              attributes=()):
+    annotations = [{"annotationtitle": "Status", "annotationtext": status}]
+    if keywords:
+        annotations.append(
+            {"annotationtitle": "Keywords", "annotationtext": keywords})
+    return KeyFamily(**{
+        "agencyid": "NOMIS",
+        "version": 1.0,
+        "id": id,
+        "name": {"value": name, "lang": "en"},
+        "description": {"value": description, "lang": "en"} if description else None,
+        "uri": id,
+        "components": {
+            "dimension": [
+                {"codelist": "CL_FREQ", "conceptref": "FREQ",
+                    "isfrequencydimension": True},
+                {"codelist": f"CL_{id}_MEASURES", "conceptref": "MEASURES"},
+            ] + [{"codelist": f"CL_{id}_{d}", "conceptref": d} for d in dimensions],
+            "timedimension": {"conceptref": "TIME", "codelist": f"CL_{id}_TIME"},
+            "primarymeasure": {"conceptref": "OBS_VALUE"},
+            "attribute": list(attributes),
+        },
+        "annotations": {"annotation": annotations},
+    })
+
+
+CATALOGUE = [
+    keyfamily("NM_1_1", "Jobseeker's Allowance with rates and proportions",
+              keywords="Claimants,JSA", dimensions=['SEX', 'ITEM']),
+    keyfamily("NM_2010_1", "Population estimates - local authority based by five year age band",
+              description="Mid-year population estimates", dimensions=['GENDER', 'C_AGE']),
+    keyfamily("NM_31_1", "Population estimates - local authority based by single year of age",
+              status='Historical (not actively being updated)', dimensions=['SEX', 'AGE']),
+]
+
+
+def test_index_ranking():
+    index = NomisIndex(CATALOGUE)
+    ids = [id for id, _ in index.search('population')]
+    # The description mentions population too
+    assert ids == ['NM_2010_1', 'NM_31_1']
+
+
+def test_index_prefix_and_all_terms():
+    index = NomisIndex(CATALOGUE)
+    assert [id for id, _ in index.search('popul single')] == ['NM_31_1']
+    assert [id for id, _ in index.search('jsa')] == ['NM_1_1']
+    assert [id for id, _ in index.search('c_age')] == ['NM_2010_1']
+    assert index.search('population jsa') == []
+
+
+def test_index_exact_id_first():
+    index = NomisIndex(CATALOGUE)
+    assert index.search('NM_31_1')[0][0] == 'NM_31_1'
+
+
+def test_lax_keyfamily():
+    strict = CATALOGUE[1]
+    lax = LaxKeyFamily.model_validate_json(strict.model_dump_json())
+    assert str(NomisSearchHit(lax)) == str(NomisSearchHit(strict))
+
+
+def test_results_are_lazy_and_filterable():
+    results = NomisSearchResults(NomisSearchHit(k) for k in CATALOGUE)
+    assert results.filter(is_current=True).ids == ['NM_1_1', 'NM_2010_1']
+    assert results.filter(has_dimension='c_age').ids == ['NM_2010_1']
+    assert results.filter(has_dimension=['SEX', 'time'],
+                          is_current=False).ids == ['NM_31_1']
+    assert not any('dimensions' in vars(hit) for hit in results)
+    assert results[2].dimensions.age == 'CL_NM_31_1_AGE'
+    assert isinstance(results[1:], NomisSearchResults)
+    assert len(results[1:]) == 2
+
+
+def test_results_are_a_list():
+    hits = [NomisSearchHit(k) for k in CATALOGUE]
+    results = NomisSearchResults(hits[:2])
+    assert results == hits[:2]
+    results.append(hits[2])
+    assert results.ids == ['NM_1_1', 'NM_2010_1', 'NM_31_1']
+
+
+def test_unknown_status_raises():
+    results = NomisSearchResults([NomisSearchHit(keyfamily("NM_9_1", "Test", status='Withdrawn'))])
+    with pytest.raises(ValueError):
+        results.filter(is_current=True)
+    with pytest.raises(ValueError):
+        results[0].is_current
+
+
+def test_local_search_reads_only_the_index(server, monkeypatch):
+    monkeypatch.setattr(api, 'BASE_URL', server.url)
+    monkeypatch.setattr(index, 'CATALOGUE_URL', server.url + '/dataset/def.sdmx.json')
+    monkeypatch.setattr(index, '_loaded', None)
+    api.cache_clear()
+    server.files['/dataset/def.sdmx.json'] = json.dumps({"structure": {"keyfamilies": {
+        "keyfamily": [k.model_dump(mode='json') for k in CATALOGUE]}}}).encode()
+    assert search('population', local=True).ids == ['NM_2010_1', 'NM_31_1']
+
+    def fail(*args, **kwargs):
+        raise AssertionError('should not parse the catalogue')
+    monkeypatch.setattr(api, 'fetch_search', fail)
+    assert search('jsa', local=True).ids == ['NM_1_1']
+    # From the snapshot on disk, as in a new process
+    monkeypatch.setattr(index, '_loaded', None)
+    assert search(local=True, is_current=True).ids == ['NM_1_1', 'NM_2010_1']
@@ -35,3 +35,16 @@ def test_lib_codelist():
 def test_lib_search():
     ds = nomis.search('population')
     assert len(ds) == 13
+
+
+def test_lib_search_local():
+    remote = {hit.id for hit in nomis.search('population')}
+    local = {hit.id for hit in nomis.search('population', local=True)}
+    assert remote <= local
+
+
+def test_api_search_lax():
+    strict = nomis.api.fetch_search(q='population')
+    lax = nomis.api.fetch_search(q='population', validation='lax')
+    assert [k.id for k in lax.structure.keyfamilies.keyfamily] == \
+        [k.id for k in strict.structure.keyfamilies.keyfamily]
@@ -1,3 +1,3 @@
-from .load import load
+from .load import load, aload, load_many, iter_load
 
-__all__ = ['load']
+__all__ = ['load', 'aload', 'load_many', 'iter_load']
@@ -1,10 +1,11 @@
-import requests
+import asyncio
 import pandas as pd
 from pydantic import TypeAdapter, BaseModel
-from typing import TypeVar, Type
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, Tuple, TypeVar, Type
 from .schema.ds_root import DatasetRoot
 from .schema.ds_version import DatasetVersion
-from updatabot import logger, load_url
+from updatabot import logger, load_url, aload_url, session
 
 T = TypeVar('T', bound=BaseModel)
 
@@ -14,7 +15,7 @@ def load(id: str) -> pd.DataFrame:
     # Phase 1: Fetch the dataset root JSON
     url = f"https://api.beta.ons.gov.uk/v1/datasets/{id}"
     logger.info(f"Loading dataset {id} from {url}")
-    response = requests.get(url)
+    response = session.get(url)
     response.raise_for_status()
     # Validate response against schema
     root = TypeAdapter(DatasetRoot).validate_python(response.json())
@@ -28,7 +29,7 @@ def load(id: str) -> pd.DataFrame:
     # --
     # Phase 2: Fetch the dataset version JSON
     logger.info(f"Loading dataset version {id} from {url}")
-    response = requests.get(url)
+    response = session.get(url)
     response.raise_for_status()
     # Validate response against schema
     version = TypeAdapter(DatasetVersion).validate_python(response.json())
@@ -43,3 +44,91 @@ def load(id: str) -> pd.DataFrame:
         return load_url(version.downloads.xls.href.unicode_string())
     raise ValueError(
         f"Dataset version {id} has no CSV or XLS downloads listed")
+
+
+async def aload(id: str) -> pd.DataFrame:
+    """Awaitable load(), sharing its cache. Every request runs on the event
+    loop, with aiohttp installed. Otherwise load() runs in a worker thread."""
+    if not session._async_available():
+        return await asyncio.to_thread(load, id)
+    # --
+    # Phase 1: Fetch the dataset root JSON
+    url = f"https://api.beta.ons.gov.uk/v1/datasets/{id}"
+    logger.info(f"Loading dataset {id} from {url}")
+    root = TypeAdapter(DatasetRoot).validate_python(await _aget_json(url))
+    logger.info(f"Dataset {id} loaded successfully: {root.title}")
+    if not root.links.latest_version.href:
+        raise ValueError(f"Dataset {id} has no latest version listed")
+    url = root.links.latest_version.href.unicode_string()
+
+    # --
+    # Phase 2: Fetch the dataset version JSON
+    logger.info(f"Loading dataset version {id} from {url}")
+    version = TypeAdapter(DatasetVersion).validate_python(await _aget_json(url))
+    logger.info(
+        f"Dataset version {id} loaded successfully: release date={version.release_date}")
+
+    # --
+    # Phase 3: Download the data
+    if version.downloads.csv:
+        return await aload_url(version.downloads.csv.href.unicode_string())
+    if version.downloads.xls:
+        return await aload_url(version.downloads.xls.href.unicode_string())
+    raise ValueError(
+        f"Dataset version {id} has no CSV or XLS downloads listed")
+
+
+async def _aget_json(url: str) -> dict:
+    async with session.aget(url) as response:
+        session._raise_for_status(response)
+        # The ONS API does not always label its JSON as such
+        return await response.json(content_type=None)
+
+
+def iter_load(ids: Iterable[str], max_workers: int = 8,
+              return_exceptions: bool = False) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Load many datasets concurrently, yielding (id, DataFrame) pairs in the
+    order they finish. Each worker runs all three phases of load() for one
+    dataset, so metadata requests for some datasets overlap with downloads
+    for others.
+
+    Args:
+        ids: ONS dataset IDs, eg. ["TS001", "TS002"]. Duplicates are loaded once.
+        max_workers: Number of datasets to load at once.
+        return_exceptions: Yield (id, exception) for a dataset that fails,
+            and carry on with the rest. Otherwise the first failure is
+            raised, and datasets not yet started are cancelled.
+    """
+    ids = list(dict.fromkeys(ids))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(load, id): id for id in ids}
+        try:
+            for future in as_completed(futures):
+                id = futures[future]
+                try:
+                    df = future.result()
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    logger.error(f"Failed to load dataset {id}: {e}")
+                    yield id, e
+                    continue
+                yield id, df
+        finally:
+            # Also runs when the caller stops iterating early
+            for future in futures:
+                future.cancel()
+
+
+def load_many(ids: Iterable[str], max_workers: int = 8,
+              return_exceptions: bool = False) -> Dict[str, pd.DataFrame]:
+    """
+    Load many datasets concurrently. See iter_load().
+
+    Returns:
+        DataFrames by dataset ID, in the order of ids.
+    """
+    ids = list(dict.fromkeys(ids))
+    loaded = dict(iter_load(ids, max_workers, return_exceptions))
+    return {id: loaded[id] for id in ids}
@@ -0,0 +1,50 @@
+# Run with "pytest"
+# load() is stubbed, so only the batching is exercised.
+import importlib
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from . import iter_load, load_many
+
+# The package re-exports load(), which shadows the module attribute
+load_module = importlib.import_module('updatabot.ons.load')
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def fake_load(id):
+        with lock:
+            calls.append(id)
+        if id == 'BAD':
+            raise ValueError("no downloads")
+        # Later IDs finish first
+        time.sleep(0.05 if id == 'TS001' else 0)
+        return pd.DataFrame({'id': [id]})
+
+    monkeypatch.setattr(load_module, 'load', fake_load)
+    return calls
+
+
+def test_load_many(loads):
+    found = load_many(['TS001', 'TS002', 'TS001'], max_workers=2)
+    assert list(found) == ['TS001', 'TS002']
+    assert found['TS002']['id'][0] == 'TS002'
+    assert sorted(loads) == ['TS001', 'TS002']
+
+
+def test_iter_load_streams_as_completed(loads):
+    assert [id for id, _ in iter_load(['TS001', 'TS002'], max_workers=2)] == ['TS002', 'TS001']
+
+
+def test_errors(loads):
+    with pytest.raises(ValueError):
+        load_many(['BAD', 'TS002'])
+    found = load_many(['BAD', 'TS002'], return_exceptions=True)
+    assert isinstance(found['BAD'], ValueError)
+    assert len(found['TS002']) == 1
@@ -0,0 +1,250 @@
+from bisect import bisect_right
+from pathlib import Path
+import io
+import os
+import re
+import shutil
+import threading
+from . import cache
+from . import session
+from .logger import logger
+
+# "bytes 0-99/1234"
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+def _largest_first(files) -> list[tuple[int, int]]:
+    """Fetched ranges in the order to add them, so that overlaps split as few spans as possible"""
+    return sorted(files, key=lambda file: file[0] - file[1])
+
+
+class RangesUnsupported(Exception):
+    """The server answered a Range request with the whole file"""
+
+
+class RemoteChanged(IOError):
+    """The remote file changed while it was being read in ranges"""
+
+
+class RangeFile(io.RawIOBase):
+    """
+    A read-only, seekable view of a remote file, read with HTTP Range requests.
+
+    Every range fetched is kept as a file in ranges_dir, named
+    "{start}-{end}", so no byte is downloaded twice. Reads that are not
+    covered by fetched ranges fetch exactly the gaps, so fetch() whole
+    regions up front to avoid many small requests.
+
+    Pass the ETag or Last-Modified from when size was read as validator.
+    Each request then carries If-Range, so that bytes from a newer version
+    of the file are never spliced in with older ones. If the file has
+    changed, ranges_dir is deleted and RemoteChanged is raised.
+
+    In offline mode (UPDATABOT_CACHE_OFFLINE), reading bytes that are not
+    in ranges_dir raises ValueError instead of fetching them.
+    """
+
+    def __init__(self, url: str, size: int, ranges_dir: Path, validator: str | None = None):
+        self.url = url
+        self.size = size
+        self.ranges_dir = ranges_dir
+        self.validator = validator
+        self._pos = 0
+        self._lock = threading.Lock()
+        # Sorted, non-overlapping (start, end, file) spans, where file is the
+        # (start, end) of the fetched range holding those bytes. Ranges
+        # fetched by other processes can overlap, so one file may back
+        # several spans, and some of its bytes may be served by another.
+        self._segments = []
+        self._files = set()
+        # The file last read from, and its open handle
+        self._segment = None
+        self._segment_file = None
+        self._scan()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), self.size - self._pos)
+        if n <= 0:
+            return 0
+        data = self._read(self._pos, self._pos + n)
+        buffer[:n] = data
+        self._pos += n
+        return n
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_segment()
+        super().close()
+
+    def _close_segment(self) -> None:
+        if self._segment_file is not None:
+            self._segment_file.close()
+        self._segment = self._segment_file = None
+
+    def _scan(self) -> None:
+        """Pick up ranges in ranges_dir, including those fetched by other processes"""
+        if not self.ranges_dir.is_dir():
+            return
+        found = []
+        for path in self.ranges_dir.iterdir():
+            start, sep, end = path.name.partition('-')
+            if sep and start.isdigit() and end.isdigit():
+                found.append((int(start), int(end)))
+        with self._lock:
+            for file in _largest_first(set(found) - self._files):
+                self._add(file)
+
+    def _add(self, file: tuple[int, int]) -> None:
+        """Serve the bytes of a fetched range not already held. Call with _lock held."""
+        self._files.add(file)
+        for start, end in self._uncovered(*file):
+            self._segments.insert(bisect_right(self._segments, (start,)), (start, end, file))
+
+    def _forget(self, file: tuple[int, int]) -> None:
+        """Drop a range whose file was evicted. Call with _lock held."""
+        # Other files may hold some of its bytes, so share them out again
+        files = self._files - {file}
+        self._segments = []
+        self._files = set()
+        for other in _largest_first(files):
+            self._add(other)
+
+    def _containing(self, pos: int) -> tuple[int, int, tuple[int, int]] | None:
+        """The span holding byte pos, if any. Call with _lock held."""
+        i = bisect_right(self._segments, (pos, float('inf'))) - 1
+        if i >= 0 and self._segments[i][1] > pos:
+            return self._segments[i]
+        return None
+
+    def _uncovered(self, start: int, end: int) -> list[tuple[int, int]]:
+        """The parts of [start, end) not held. Call with _lock held."""
+        gaps = []
+        pos = start
+        i = max(bisect_right(self._segments, (pos, float('inf'))) - 1, 0)
+        for s, e, _ in self._segments[i:]:
+            if s >= end:
+                break
+            if s > pos:
+                gaps.append((pos, s))
+            pos = max(pos, e)
+            if pos >= end:
+                break
+        if pos < end:
+            gaps.append((pos, end))
+        return gaps
+
+    def _gaps(self, start: int, end: int) -> list[tuple[int, int]]:
+        """The parts of [start, end) not yet fetched"""
+        with self._lock:
+            return self._uncovered(start, end)
+
+    def _read(self, start: int, end: int) -> bytes:
+        out = bytearray()
+        while start < end:
+            with self._lock:
+                span = self._containing(start)
+                if span is not None:
+                    _, e, file = span
+                    try:
+                        if self._segment != file:
+                            self._close_segment()
+                            self._segment_file = open(self.ranges_dir / f"{file[0]}-{file[1]}", 'rb')
+                            self._segment = file
+                        self._segment_file.seek(start - file[0])
+                        data = self._segment_file.read(min(e, end) - start)
+                    except FileNotFoundError:
+                        # Evicted from the cache. Fetch it again.
+                        self._close_segment()
+                        self._forget(file)
+                        continue
+                    out += data
+                    start += len(data)
+                    continue
+            self.fetch(start, end)
+        return bytes(out)
+
+    def fetch(self, start: int, end: int) -> None:
+        """Download bytes [start, end) into ranges_dir, apart from those already held."""
+        start, end = max(0, start), min(self.size, end)
+        gaps = self._gaps(start, end)
+        if gaps:
+            # Another process may have fetched them since we last looked
+            self._scan()
+            gaps = self._gaps(start, end)
+        for gap_start, gap_end in gaps:
+            self._fetch(gap_start, gap_end)
+
+    def _fetch(self, start: int, end: int) -> None:
+        if cache.is_offline():
+            raise ValueError(
+                f"Offline mode (UPDATABOT_CACHE_OFFLINE) is set, and {self.url} is not cached")
+        headers = {'Range': f'bytes={start}-{end - 1}'}
+        if self.validator:
+            headers['If-Range'] = self.validator
+        with session.get(self.url, headers=headers, stream=True) as response:
+            if response.status_code == 200:
+                if self.validator and self.validator not in (
+                        response.headers.get('ETag'), response.headers.get('Last-Modified')):
+                    self._changed()
+                raise RangesUnsupported(f"{self.url} does not support range requests")
+            response.raise_for_status()
+            match = _CONTENT_RANGE.fullmatch(response.headers.get('Content-Range', ''))
+            if not match:
+                raise IOError(
+                    f"Expected Content-Range for bytes {start}-{end - 1} of {self.url}, "
+                    f"got {response.headers.get('Content-Range')!r}")
+            if match[3] != '*' and int(match[3]) != self.size:
+                self._changed()
+            if (int(match[1]), int(match[2]) + 1) != (start, end):
+                raise IOError(
+                    f"Asked for bytes {start}-{end - 1} of {self.url}, got {match[0]}")
+            self.ranges_dir.mkdir(parents=True, exist_ok=True)
+            path = self.ranges_dir / f"{start}-{end}"
+            tmp_path = self.ranges_dir / cache._tmp_name(path.name)
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+                if os.path.getsize(tmp_path) != end - start:
+                    raise IOError(
+                        f"Expected {end - start} bytes from {self.url}, got {os.path.getsize(tmp_path)}")
+                os.replace(tmp_path, path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+        logger.debug(f"Fetched bytes {start}-{end} of {self.url}")
+        with self._lock:
+            if (start, end) not in self._files:
+                self._add((start, end))
+
+    def _changed(self):
+        """Forget every range fetched, and raise RemoteChanged"""
+        with self._lock:
+            self._close_segment()
+            self._segments = []
+            self._files = set()
+        shutil.rmtree(self.ranges_dir, ignore_errors=True)
+        raise RemoteChanged(
+            f"{self.url} changed on the server while it was being read. Load it again.")
@@ -0,0 +1,209 @@
+import asyncio
+import contextlib
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .logger import logger
+
+try:
+    import aiohttp
+except ImportError:
+    # Optional: without it, the async API runs downloads in threads
+    aiohttp = None
+
+UPDATABOT_USER_AGENT = 'updatabot/0.1 (https://github.com/updatabot/python-updatabot)'
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session: requests.Session | None = None
+_timeout: float | None = None
+_retries = 0
+_backoff_factor = 0.0
+_pool_size = 16
+_lock = threading.RLock()
+
+# Attribute of each event loop holding its aiohttp session, as
+# (requests session it mirrors, client, closer). Kept on the loop, so that
+# nothing here keeps a finished loop alive.
+_ASYNC_SESSION_ATTR = '_updatabot_async_session'
+
+
+def configure_session(retries: int | None = None,
+                      backoff_factor: float | None = None,
+                      timeout: float | None = None,
+                      pool_size: int | None = None,
+                      ) -> requests.Session:
+    """Replace the shared HTTP session used for every download.
+    The async downloads of aload_url() and friends use the same settings.
+
+    Any argument left as None is read from the environment:
+
+        UPDATABOT_HTTP_RETRIES   (default 5)
+        UPDATABOT_HTTP_BACKOFF   (default 0.5 seconds, doubling per retry)
+        UPDATABOT_HTTP_TIMEOUT   (default 60 seconds to connect, or between bytes)
+        UPDATABOT_HTTP_POOL_SIZE (default 16 connections per host)
+
+    Args:
+        retries (int): Retries on connection errors, 429 and 5xx responses.
+        backoff_factor (float): Exponential backoff between retries.
+                                Retry-After headers are honoured.
+        timeout (float): Seconds to wait for a connection or for data.
+        pool_size (int): Keep-alive connections to hold open per host.
+
+    Returns:
+        requests.Session: The new shared session.
+    """
+    global _session, _timeout, _retries, _backoff_factor, _pool_size
+    if retries is None:
+        retries = int(os.environ.get('UPDATABOT_HTTP_RETRIES', 5))
+    if backoff_factor is None:
+        backoff_factor = float(os.environ.get('UPDATABOT_HTTP_BACKOFF', 0.5))
+    if timeout is None:
+        timeout = float(os.environ.get('UPDATABOT_HTTP_TIMEOUT', 60))
+    if pool_size is None:
+        pool_size = int(os.environ.get('UPDATABOT_HTTP_POOL_SIZE', 16))
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=['GET', 'HEAD'],
+        respect_retry_after_header=True,
+        # Hand the final response back so callers see a normal HTTPError
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry,
+                          pool_connections=pool_size,
+                          pool_maxsize=pool_size)
+    session = requests.Session()
+    session.headers['User-Agent'] = UPDATABOT_USER_AGENT
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    logger.debug(
+        f"Configured HTTP session: retries={retries}, backoff={backoff_factor}, timeout={timeout}, pool_size={pool_size}")
+
+    with _lock:
+        old = _session
+        _session, _timeout = session, timeout
+        _retries, _backoff_factor, _pool_size = retries, backoff_factor, pool_size
+    if old is not None:
+        old.close()
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the shared HTTP session, creating it on first use."""
+    if _session is None:
+        with _lock:
+            if _session is None:
+                configure_session()
+    return _session
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET a URL through the shared session, with the default timeout."""
+    session = get_session()
+    kwargs.setdefault('timeout', _timeout)
+    return session.get(url, **kwargs)
+
+
+def head(url: str, **kwargs) -> requests.Response:
+    """HEAD a URL through the shared session, with the default timeout."""
+    session = get_session()
+    kwargs.setdefault('timeout', _timeout)
+    kwargs.setdefault('allow_redirects', True)
+    return session.head(url, **kwargs)
+
+
+def _async_available() -> bool:
+    return aiohttp is not None
+
+
+async def _close_with_loop(loop, client):
+    """Closes client when its event loop shuts down its async generators,
+    as asyncio.run() does"""
+    try:
+        yield
+    finally:
+        current = getattr(loop, _ASYNC_SESSION_ATTR, None)
+        if current is not None and current[1] is client:
+            delattr(loop, _ASYNC_SESSION_ATTR)
+        await client.close()
+
+
+async def get_async_session() -> 'aiohttp.ClientSession':
+    """Return the aiohttp session for the running event loop, creating it on
+    first use. It follows configure_session(), and is closed when the loop
+    finishes under asyncio.run(). Requires aiohttp."""
+    if aiohttp is None:
+        raise ImportError("Async downloads require aiohttp: pip install updatabot[async]")
+    session = get_session()
+    loop = asyncio.get_running_loop()
+    current = getattr(loop, _ASYNC_SESSION_ATTR, None)
+    if current is not None and current[0] is session and not current[1].closed:
+        return current[1]
+    client = aiohttp.ClientSession(
+        headers={'User-Agent': UPDATABOT_USER_AGENT},
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=_timeout, sock_read=_timeout),
+        connector=aiohttp.TCPConnector(limit=0, limit_per_host=_pool_size),
+    )
+    closer = _close_with_loop(loop, client)
+    await closer.__anext__()
+    setattr(loop, _ASYNC_SESSION_ATTR, (session, client, closer))
+    if current is not None:
+        # configure_session() was called since: retire the old client
+        await current[1].close()
+    return client
+
+
+def _retry_delay(attempt: int, response=None) -> float:
+    """Seconds to wait before retry number attempt (from 0), as urllib3 does"""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return float(retry_after)
+    return 0.0 if attempt == 0 else _backoff_factor * 2 ** attempt
+
+
+def _raise_for_status(response: 'aiohttp.ClientResponse') -> None:
+    """Raise requests.HTTPError for a 4xx or 5xx, as the sync API does"""
+    if response.status >= 400:
+        raise requests.HTTPError(
+            f"{response.status} Error: {response.reason} for url: {response.url}")
+
+
+@contextlib.asynccontextmanager
+async def aget(url: str, headers: dict | None = None):
+    """
+    GET a URL through the event loop's aiohttp session, yielding the
+    response once its headers arrive. Connection errors, timeouts, 429 and
+    5xx responses are retried like get(), as set by configure_session().
+    Failures raise the same requests exceptions as get().
+    """
+    client = await get_async_session()
+    attempt = 0
+    while True:
+        try:
+            response = await client.get(url, headers=headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt >= _retries:
+                if isinstance(e, asyncio.TimeoutError):
+                    raise requests.Timeout(f"Timed out fetching {url}") from e
+                raise requests.ConnectionError(f"Failed to fetch {url}: {e}") from e
+            delay = _retry_delay(attempt)
+            logger.debug(f"Retrying {url} in {delay}s after {e!r}")
+        else:
+            if response.status not in RETRY_STATUSES or attempt >= _retries:
+                try:
+                    yield response
+                finally:
+                    response.release()
+                return
+            delay = _retry_delay(attempt, response)
+            response.release()
+            logger.debug(f"Retrying {url} in {delay}s after HTTP {response.status}")
+        attempt += 1
+        await asyncio.sleep(delay)